@@ -3,9 +3,18 @@
 Fib 36.90% Strategy Backtest (Auto Run, BUY + SELL + Breakdown)
 """
 
+import os
+import argparse
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+from pyarrow import csv as pacsv
+import matplotlib
+matplotlib.use("Agg")  # headless: no GUI backend probe
 import matplotlib.pyplot as plt
+import xlsxwriter
+from numba import njit
+from fib369_core import SELL, BUY, setup_levels
 from pathlib import Path
 
 # ---------------- CONFIG ----------------
@@ -21,174 +30,251 @@ TP_LEVEL = 1.111      # 111.10%
 
 TRADE_HOURS = [(0,0), (5,30), (18,0)]  # allowed times
 
+# charts can be switched off for bulk runs (FIB369_CHARTS=0 or --no-charts)
+CHARTS = os.getenv("FIB369_CHARTS", "1") == "1"
+CHART_DPI = 90
+
+# explicit CSV column types (skips per-column type inference); OHLCV as
+# float32 - ~7 significant digits is plenty for a 0.59% move threshold
+PRICE_COLUMNS = ("open", "high", "low", "close", "volume")
+CSV_COLUMN_TYPES = {
+    "timestamp": pa.int64(),
+    "time": pa.int64(),
+    **{c: pa.float32() for c in PRICE_COLUMNS},
+}
+
 
 # ---------------- HELPERS ----------------
 def read_data(path):
     print(f"Loading data from: {path}")
-    df = pd.read_csv(path)
+    if str(path).endswith(".parquet"):
+        df = pd.read_parquet(path)
+    else:
+        tbl = pacsv.read_csv(path, convert_options=pacsv.ConvertOptions(column_types=CSV_COLUMN_TYPES))
+        df = tbl.to_pandas(self_destruct=True, split_blocks=True)
+        del tbl
+    for c in PRICE_COLUMNS:
+        if c in df.columns and df[c].dtype != np.float32:
+            df[c] = df[c].astype(np.float32)
     if "timestamp" in df.columns:
-        df["datetime"] = pd.to_datetime(df["timestamp"], unit="ms")
+        ts, unit = df["timestamp"].to_numpy(np.int64), "datetime64[ms]"
     elif "time" in df.columns:
-        df["datetime"] = pd.to_datetime(df["time"], unit="s")
+        ts, unit = df["time"].to_numpy(np.int64), "datetime64[s]"
     else:
         raise ValueError("CSV must contain timestamp or time column")
-    df = df.sort_values("datetime").reset_index(drop=True)
+    # Binance exports are already time-ordered; only sort when they are not
+    if not (np.diff(ts) >= 0).all():
+        order = np.argsort(ts, kind="stable")
+        df, ts = df.iloc[order].reset_index(drop=True), ts[order]
+    # epoch ints reinterpreted as datetime64 (no per-element conversion)
+    df["datetime"] = ts.view(unit)
+    # calendar day as a plain int (days since epoch) for cheap same-day checks
+    df["day_id"] = df["datetime"].to_numpy().astype("datetime64[D]").view("i8").astype(np.int32)
     return df
 
 
 def compute_drawdown(equity_curve):
-    roll_max = equity_curve.cummax()
-    dd = (equity_curve - roll_max) / roll_max
+    eq = np.asarray(equity_curve, dtype=np.float64)
+    roll_max = np.maximum.accumulate(eq)
+    dd = (eq - roll_max) / roll_max
     return dd, dd.min()
 
 
-# ---------------- STRATEGY ----------------
-def run_backtest(df):
-    equity = INITIAL_BALANCE
-    trades = []
-    last_tp_day = None
+@njit(cache=True)
+def _rolling_fwd_extreme(arr, w, is_max):
+    # sweep right-to-left keeping a monotonic deque of indices in dq[head:tail];
+    # the head is always the extreme of arr[i:i+w]
+    n = len(arr)
+    out = np.empty(n, arr.dtype)
+    dq = np.empty(n, np.int64)
+    head = 0
+    tail = 0
+    for i in range(n - 1, -1, -1):
+        while tail > head and ((is_max and arr[dq[tail-1]] <= arr[i]) or
+                               (not is_max and arr[dq[tail-1]] >= arr[i])):
+            tail -= 1
+        dq[tail] = i
+        tail += 1
+        while dq[head] >= i + w:
+            head += 1
+        out[i] = arr[dq[head]]
+    return out
 
-    for i in range(100, len(df)):
-        row = df.iloc[i]
-        dt_row = row["datetime"]
 
-        # weekend skip
-        if dt_row.weekday() in (5,6):
-            continue
+@njit(cache=True)
+def rolling_fwd_max(arr, w=50):
+    """fwd[i] == arr[i:i+w].max(), O(n) over the whole series."""
+    return _rolling_fwd_extreme(arr, w, True)
+
+
+@njit(cache=True)
+def rolling_fwd_min(arr, w=50):
+    """fwd[i] == arr[i:i+w].min(), O(n) over the whole series."""
+    return _rolling_fwd_extreme(arr, w, False)
+
 
-        # time filter
-        if not any((dt_row.hour == h and dt_row.minute == m) for h,m in TRADE_HOURS):
+# ---------------- STRATEGY ----------------
+TP, SL, EOD = 0, 1, 2
+SIDE_NAMES = np.array(["SELL", "BUY"])
+REASON_NAMES = np.array(["TP", "SL", "EOD"])
+
+
+@njit(cache=True)
+def _scan_trade(close, high, low, i, day_end, side, trigger_price, tp_price, sl_price):
+    """Walk bars i+1..day_end-1 (rest of the day); returns (entry bar, exit bar, reason) or (-1, -1, -1)."""
+    armed = False
+    for j in range(i+1, day_end):
+        if not armed:
+            if (side == SELL and close[j] < trigger_price) or (side == BUY and close[j] > trigger_price):
+                armed = True
             continue
 
+        if (side == SELL and high[j] >= trigger_price) or (side == BUY and low[j] <= trigger_price):
+            for k in range(j, day_end):
+                if side == SELL:
+                    if low[k] <= tp_price:
+                        return j, k, TP
+                    if high[k] >= sl_price:
+                        return j, k, SL
+                else:
+                    if high[k] >= tp_price:
+                        return j, k, TP
+                    if low[k] <= sl_price:
+                        return j, k, SL
+            # no exit inside the day: closed at the entry bar's close
+            return j, j, EOD
+    return -1, -1, -1
+
+
+# fastmath is safe here: prices are never NaN/inf and the only reassociation
+# is in the lots/pnl multiply-adds
+@njit(fastmath=True, cache=True)
+def _run(close, high, low, day_id, candidate_idx, day_end, setup_ok, levels,
+         equity, risk_per_trade):
+    # at most one SELL and one BUY per candidate bar
+    max_trades = 2 * len(candidate_idx)
+
+    side_arr = np.empty(max_trades, np.int8)
+    reason_arr = np.empty(max_trades, np.int8)
+    entry_idx = np.empty(max_trades, np.int64)
+    exit_idx = np.empty(max_trades, np.int64)
+    entry_arr = np.empty(max_trades, np.float64)
+    sl_arr = np.empty(max_trades, np.float64)
+    tp_arr = np.empty(max_trades, np.float64)
+    exit_arr = np.empty(max_trades, np.float64)
+    pnl_arr = np.empty(max_trades, np.float64)
+    n_trades = 0
+    last_tp_day = -1
+
+    for c in range(len(candidate_idx)):
+        i = candidate_idx[c]
         # daily TP skip
-        if last_tp_day == dt_row.date():
+        if last_tp_day == day_id[i]:
             continue
 
-        start_price = row["close"]
-        window = df.iloc[i:i+50]
-        if window.empty:
-            continue
+        for side in range(2):
+            if not setup_ok[c, side]:
+                continue
+            trigger_price = levels[c, side, 0]
+            tp_price = levels[c, side, 1]
+            sl_price = levels[c, side, 2]
+
+            j, k, reason = _scan_trade(close, high, low, i, day_end[c], side,
+                                       trigger_price, tp_price, sl_price)
+            if j < 0:
+                continue
+
+            entry = trigger_price
+            if reason == TP:
+                exit_price = tp_price
+            elif reason == SL:
+                exit_price = sl_price
+            else:
+                exit_price = close[j]
+
+            if side == SELL:
+                lots = (equity * risk_per_trade) / max(sl_price - entry, 1e-6)
+                pnl = (entry - exit_price) * lots
+            else:
+                lots = (equity * risk_per_trade) / max(entry - sl_price, 1e-6)
+                pnl = (exit_price - entry) * lots
+            equity += pnl
+
+            side_arr[n_trades] = side
+            reason_arr[n_trades] = reason
+            entry_idx[n_trades] = j
+            exit_idx[n_trades] = k
+            entry_arr[n_trades] = entry
+            sl_arr[n_trades] = sl_price
+            tp_arr[n_trades] = tp_price
+            exit_arr[n_trades] = exit_price
+            pnl_arr[n_trades] = pnl
+            n_trades += 1
+
+            if reason == TP:
+                last_tp_day = day_id[i]
+
+    return (n_trades, side_arr, reason_arr, entry_idx, exit_idx,
+            entry_arr, sl_arr, tp_arr, exit_arr, pnl_arr)
 
-        max_price = window["high"].max()
-        min_price = window["low"].min()
-
-        # -------- SELL setup (UP move) --------
-        if (max_price - start_price) / start_price >= MOVE_PCT:
-            swing_low = start_price
-            swing_high = max_price
-            fib_range = swing_high - swing_low
-
-            trigger_price = swing_high - fib_range * TRIGGER_LEVEL
-            tp_price = swing_high - fib_range * TP_LEVEL
-            sl_price = swing_high * 1.001
-
-            armed = False
-            for j in range(i+1, len(df)):
-                r = df.iloc[j]
-                if r["datetime"].date() != dt_row.date():
-                    break
-
-                if not armed and r["close"] < trigger_price:
-                    armed = True
-                    continue
-
-                if armed and r["high"] >= trigger_price:
-                    entry = trigger_price
-                    lots = (equity * RISK_PER_TRADE) / max(sl_price - entry, 1e-6)
-
-                    outcome, exit_price, exit_time = None, None, None
-                    for k in range(j, len(df)):
-                        r2 = df.iloc[k]
-                        if r2["datetime"].date() != dt_row.date():
-                            break
-                        if r2["low"] <= tp_price:
-                            outcome, exit_price, exit_time = "TP", tp_price, r2["datetime"]; break
-                        if r2["high"] >= sl_price:
-                            outcome, exit_price, exit_time = "SL", sl_price, r2["datetime"]; break
-
-                    if outcome is None:
-                        r2 = df.iloc[j]
-                        outcome, exit_price, exit_time = "EOD", r2["close"], r2["datetime"]
-
-                    pnl = (entry - exit_price) * lots
-                    equity += pnl
-                    trades.append({
-                        "side": "SELL",
-                        "entry_time": r["datetime"],
-                        "entry": entry,
-                        "sl": sl_price,
-                        "tp": tp_price,
-                        "exit_time": exit_time,
-                        "exit": exit_price,
-                        "pnl": pnl,
-                        "reason": outcome
-                    })
-
-                    if outcome == "TP":
-                        last_tp_day = dt_row.date()
-                    break
-
-        # -------- BUY setup (DOWN move) --------
-        if (start_price - min_price) / start_price >= MOVE_PCT:
-            swing_high = start_price
-            swing_low = min_price
-            fib_range = swing_high - swing_low
-
-            trigger_price = swing_low + fib_range * TRIGGER_LEVEL
-            tp_price = swing_low + fib_range * TP_LEVEL
-            sl_price = swing_low * 0.999
-
-            armed = False
-            for j in range(i+1, len(df)):
-                r = df.iloc[j]
-                if r["datetime"].date() != dt_row.date():
-                    break
-
-                if not armed and r["close"] > trigger_price:
-                    armed = True
-                    continue
-
-                if armed and r["low"] <= trigger_price:
-                    entry = trigger_price
-                    lots = (equity * RISK_PER_TRADE) / max(entry - sl_price, 1e-6)
-
-                    outcome, exit_price, exit_time = None, None, None
-                    for k in range(j, len(df)):
-                        r2 = df.iloc[k]
-                        if r2["datetime"].date() != dt_row.date():
-                            break
-                        if r2["high"] >= tp_price:
-                            outcome, exit_price, exit_time = "TP", tp_price, r2["datetime"]; break
-                        if r2["low"] <= sl_price:
-                            outcome, exit_price, exit_time = "SL", sl_price, r2["datetime"]; break
-
-                    if outcome is None:
-                        r2 = df.iloc[j]
-                        outcome, exit_price, exit_time = "EOD", r2["close"], r2["datetime"]
-
-                    pnl = (exit_price - entry) * lots
-                    equity += pnl
-                    trades.append({
-                        "side": "BUY",
-                        "entry_time": r["datetime"],
-                        "entry": entry,
-                        "sl": sl_price,
-                        "tp": tp_price,
-                        "exit_time": exit_time,
-                        "exit": exit_price,
-                        "pnl": pnl,
-                        "reason": outcome
-                    })
-
-                    if outcome == "TP":
-                        last_tp_day = dt_row.date()
-                    break
-
-    return pd.DataFrame(trades)
+
+def run_backtest(df):
+    close = df["close"].to_numpy()
+    high = df["high"].to_numpy()
+    low = df["low"].to_numpy()
+    dt = df["datetime"].to_numpy()
+    day_id = df["day_id"].to_numpy()
+    fwd_max = rolling_fwd_max(high, 50)
+    fwd_min = rolling_fwd_min(low, 50)
+
+    # weekday + time filter, evaluated once for the whole series on plain ints
+    weekday = (day_id + 3) % 7  # 1970-01-01 was a Thursday
+    minute_of_day = dt.astype("datetime64[m]").view("i8") % 1440
+    slots = [h * 60 + m for h, m in TRADE_HOURS]
+    mask = (weekday < 5) & np.isin(minute_of_day, slots)
+    candidate_idx = np.flatnonzero(mask)
+    candidate_idx = candidate_idx[candidate_idx >= 100]
+    # setup levels for both sides in one pass over the candidates; bars with
+    # neither a SELL nor a BUY setup can never trade, so drop them up front
+    setup_ok, levels = setup_levels(close[candidate_idx], fwd_max[candidate_idx], fwd_min[candidate_idx],
+                                    MOVE_PCT, TRIGGER_LEVEL, TP_LEVEL)
+    keep = setup_ok.any(axis=1)
+    candidate_idx, setup_ok, levels = candidate_idx[keep], setup_ok[keep], levels[keep]
+    # first bar of the next day for each candidate (day_id is sorted), so the
+    # intra-day entry/exit scans are plain bounded loops with no date compare
+    day_end = np.searchsorted(day_id, day_id[candidate_idx], side="right")
+
+    (n, side, reason, entry_idx, exit_idx,
+     entry, sl, tp, exit_price, pnl) = _run(close, high, low, day_id, candidate_idx, day_end,
+                                            setup_ok, levels, INITIAL_BALANCE, RISK_PER_TRADE)
+    if n == 0:
+        return pd.DataFrame()
+
+    return pd.DataFrame({
+        "side": np.take(SIDE_NAMES, side[:n]),
+        "entry_time": dt[entry_idx[:n]],
+        "entry": entry[:n],
+        "sl": sl[:n],
+        "tp": tp[:n],
+        "exit_time": dt[exit_idx[:n]],
+        "exit": exit_price[:n],
+        "pnl": pnl[:n],
+        "reason": np.take(REASON_NAMES, reason[:n]),
+    })
 
 
 # ---------------- REPORTS ----------------
-def generate_reports(trades):
+def _write_sheet(workbook, name, df):
+    # constant_memory workbooks only accept writes in row order (pandas'
+    # to_excel writes column by column), so stream the frame row by row
+    ws = workbook.add_worksheet(name)
+    ws.write_row(0, 0, list(df.columns))
+    for r, row in enumerate(df.itertuples(index=False, name=None), start=1):
+        # NaN/NaT become blank cells, like pandas' to_excel (na_rep="")
+        ws.write_row(r, 0, [None if v != v else v for v in row])
+
+
+def generate_reports(trades, charts=CHARTS):
     """
     Generate summary, monthly pnl, equity curve, drawdown, charts and save
     everything into backtest_output/backtest_report.xlsx and PNG files.
@@ -197,8 +283,7 @@ def generate_reports(trades):
     trades["exit_time"] = pd.to_datetime(trades["exit_time"])
 
     # equity curve
-    equity_curve = INITIAL_BALANCE + trades["pnl"].cumsum()
-    equity_curve = pd.Series(equity_curve.values, index=np.arange(len(equity_curve)), name="equity")
+    equity_curve = INITIAL_BALANCE + trades["pnl"].to_numpy().cumsum()
 
     # drawdown
     dd, max_dd = compute_drawdown(equity_curve)
@@ -211,8 +296,8 @@ def generate_reports(trades):
 
     print("\n===== Backtest Summary =====")
     print(f"Initial Equity: {INITIAL_BALANCE:.2f}")
-    print(f"Final Equity: {equity_curve.iloc[-1]:.2f}")
-    print(f"Net PnL: {equity_curve.iloc[-1] - INITIAL_BALANCE:.2f}")
+    print(f"Final Equity: {equity_curve[-1]:.2f}")
+    print(f"Net PnL: {equity_curve[-1] - INITIAL_BALANCE:.2f}")
     print(f"Total Trades: {total}")
     print(f"Wins: {wins} | Losses: {losses} | Winrate: {winrate:.2f}%")
     print(f"Max Drawdown: {max_dd:.2%}")
@@ -228,65 +313,75 @@ def generate_reports(trades):
             print(f"\n-- {side} Breakdown --")
             print(f"Trades: {stotal} | Wins: {swins} | Losses: {sloss} | Winrate: {swinrate:.2f}%")
 
-    # monthly pnl
-    trades["month"] = trades["exit_time"].dt.to_period("M")
-    monthly = trades.groupby("month")["pnl"].sum()
+    # monthly pnl: exits are time-ordered, so each month is one contiguous run
+    # (the stable argsort is a linear pass on already-sorted input)
+    exit_months = trades["exit_time"].to_numpy().astype("datetime64[M]")
+    month_id = exit_months.view("i8")
+    order = np.argsort(month_id, kind="stable")
+    month_id = month_id[order]
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(month_id)) + 1))
+    monthly_df = pd.DataFrame({
+        "month": month_id[starts].astype("datetime64[M]").astype(str),
+        "pnl": np.add.reduceat(trades["pnl"].to_numpy()[order], starts),
+    })
+    trades["month"] = exit_months.astype(str)
 
     # --- Save Excel report with multiple sheets ---
     report_path = OUTDIR / "backtest_report.xlsx"
     try:
-        with pd.ExcelWriter(report_path, engine="xlsxwriter") as writer:
+        options = {"constant_memory": True, "nan_inf_to_errors": True, "default_date_format": "yyyy-mm-dd hh:mm:ss"}
+        with xlsxwriter.Workbook(report_path, options) as workbook:
             # Trades (raw)
-            trades.to_excel(writer, sheet_name="Trades", index=False)
+            _write_sheet(workbook, "Trades", trades)
 
             # Monthly PnL
-            monthly_df = monthly.reset_index()
-            monthly_df["month"] = monthly_df["month"].astype(str)
-            monthly_df.to_excel(writer, sheet_name="Monthly_PnL", index=False)
+            _write_sheet(workbook, "Monthly_PnL", monthly_df)
 
             # Equity curve
-            equity_df = pd.DataFrame({"equity": equity_curve.values})
-            equity_df.to_excel(writer, sheet_name="Equity_Curve", index=False)
+            equity_df = pd.DataFrame({"equity": equity_curve})
+            _write_sheet(workbook, "Equity_Curve", equity_df)
 
             # Drawdown
-            dd_df = pd.DataFrame({"drawdown": dd.values})
-            dd_df.to_excel(writer, sheet_name="Drawdown", index=False)
+            dd_df = pd.DataFrame({"drawdown": dd})
+            _write_sheet(workbook, "Drawdown", dd_df)
 
             # Summary
             summary = pd.DataFrame({
                 "Initial Balance": [INITIAL_BALANCE],
-                "Final Balance": [equity_curve.iloc[-1]],
-                "Net PnL": [equity_curve.iloc[-1] - INITIAL_BALANCE],
+                "Final Balance": [equity_curve[-1]],
+                "Net PnL": [equity_curve[-1] - INITIAL_BALANCE],
                 "Total Trades": [total],
                 "Wins": [wins],
                 "Losses": [losses],
                 "Winrate %": [winrate],
                 "Max Drawdown %": [max_dd * 100]
             })
-            summary.to_excel(writer, sheet_name="Summary", index=False)
+            _write_sheet(workbook, "Summary", summary)
 
         print(f"✅ Report saved to {report_path}")
     except Exception as e:
         print("Error saving Excel report:", e)
 
     # --- Save charts ---
+    if not charts:
+        return
     try:
         plt.figure(figsize=(12, 6))
-        plt.plot(equity_curve.values)
+        plt.plot(equity_curve)
         plt.title("Equity Curve")
         plt.xlabel("Trade #")
         plt.ylabel("Equity")
         plt.grid(True)
-        plt.savefig(OUTDIR / "equity_curve.png")
+        plt.savefig(OUTDIR / "equity_curve.png", dpi=CHART_DPI, format="png", metadata={})
         plt.close()
 
         plt.figure(figsize=(12, 4))
-        plt.plot(dd.values)
+        plt.plot(dd)
         plt.title("Drawdown")
         plt.xlabel("Trade #")
         plt.ylabel("Drawdown")
         plt.grid(True)
-        plt.savefig(OUTDIR / "drawdown.png")
+        plt.savefig(OUTDIR / "drawdown.png", dpi=CHART_DPI, format="png", metadata={})
         plt.close()
 
         print(f"✅ Charts saved to {OUTDIR}/equity_curve.png and drawdown.png")
@@ -296,12 +391,16 @@ def generate_reports(trades):
 
 # ---------------- MAIN ----------------
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--no-charts", action="store_true", help="Skip PNG charts (bulk runs)")
+    args = parser.parse_args()
+
     df = read_data(INPUT_CSV)
     trades = run_backtest(df)
     if trades.empty:
         print("No trades executed.")
         return
-    generate_reports(trades)
+    generate_reports(trades, charts=CHARTS and not args.no_charts)
 
 if __name__ == "__main__":
     main()
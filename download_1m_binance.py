@@ -1,43 +1,66 @@
-from binance.client import Client
+import asyncio
+import aiohttp
+from aiolimiter import AsyncLimiter
 import pandas as pd
-import time
 
-# Binance Futures client (public data ke liye API key zaruri nahi)
-client = Client()
+# Binance Futures public klines endpoint (public data ke liye API key zaruri nahi)
+KLINES_URL = "https://fapi.binance.com/fapi/v1/klines"
 
 symbol = "BTCUSDT"
-interval = Client.KLINE_INTERVAL_1MINUTE
+interval = "1m"
 limit = 1000  # ek request me max 1000 candles
+INTERVAL_MS = 60_000
+
+# Concurrency: 10 requests in flight, aur per-IP weight budget (2400/min) ke andar
+MAX_IN_FLIGHT = 10
+REQUEST_WEIGHT = 5  # limit=1000 wali klines request ka weight
+weight_limiter = AsyncLimiter(2400, 60)
 
 # Data ko chunks me fetch karna (5 saal = ~2.6M candles)
-def fetch_klines(symbol, interval, start_str, end_str=None):
-    return client.futures_klines(
-        symbol=symbol,
-        interval=interval,
-        start_str=start_str,
-        end_str=end_str,
-        limit=limit
-    )
+async def fetch_klines(session, sem, start_ms, end_ms):
+    params = {
+        "symbol": symbol,
+        "interval": interval,
+        "startTime": start_ms,
+        "endTime": end_ms,
+        "limit": limit,
+    }
+    async with sem:
+        while True:
+            await weight_limiter.acquire(REQUEST_WEIGHT)
+            async with session.get(KLINES_URL, params=params) as resp:
+                if resp.status in (418, 429):
+                    # rate limit lag gaya: Binance jitna bole utna ruk jao
+                    await asyncio.sleep(int(resp.headers.get("Retry-After", 5)))
+                    continue
+                resp.raise_for_status()
+                return await resp.json()
+
+
+async def download(start_ms, end_ms):
+    # Time range ko pehle se 1000-candle windows me baant do, last_time ka wait nahi
+    windows = [(s, min(s + limit * INTERVAL_MS, end_ms) - 1)
+               for s in range(start_ms, end_ms, limit * INTERVAL_MS)]
+    print("Pages to fetch:", len(windows))
+
+    sem = asyncio.Semaphore(MAX_IN_FLIGHT)
+    timeout = aiohttp.ClientTimeout(total=60)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        pages = await asyncio.gather(*(fetch_klines(session, sem, s, e) for s, e in windows))
+
+    all_data = []
+    for page in pages:
+        all_data.extend(page)
+    return all_data
+
 
 # Start date set kar (example 1 Jan 2020 se ab tak)
 start_date = "1 Jan, 2020"
 print("Downloading 1m futures data for BTCUSDT from", start_date)
 
-all_data = []
-last_time = start_date
-
-while True:
-    klines = fetch_klines(symbol, interval, last_time)
-    if not klines:
-        break
-    all_data.extend(klines)
-    last_time = klines[-1][0]  # last candle ka timestamp
-    print("Fetched till:", pd.to_datetime(last_time, unit='ms'))
-    time.sleep(0.5)  # Binance rate limit safe rakhne ke liye
-
-    # Agar data ~ab tak aa gaya toh ruk jao
-    if pd.to_datetime(last_time, unit='ms') >= pd.Timestamp.now():
-        break
+start_ms = int(pd.Timestamp(start_date).timestamp() * 1000)
+end_ms = int(pd.Timestamp.now().timestamp() * 1000)
+all_data = asyncio.run(download(start_ms, end_ms))
 
 # Data ko DataFrame me convert
 df = pd.DataFrame(all_data, columns=[
@@ -1,5 +1,11 @@
 import os
-import requests
+import asyncio
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+import aiohttp
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyarrow import csv as pacsv
 
 # Binance Futures UM perpetual data base URL
 BASE_URL = "https://data.binance.vision/data/futures/um/monthly/klines/BTCUSDT/5m/"
@@ -12,28 +18,88 @@ os.makedirs(SAVE_DIR, exist_ok=True)
 years = [2019, 2020, 2021, 2022, 2023, 2024]
 months = [f"{i:02d}" for i in range(1, 13)]
 
-for year in years:
-    for month in months:
-        filename = f"BTCUSDT-5m-{year}-{month}.zip"
-        url = BASE_URL + filename
-        save_path = os.path.join(SAVE_DIR, filename)
+# Ek saath kitni files download hongi
+MAX_IN_FLIGHT = 8
+CHUNK_SIZE = 1 << 20  # 1 MiB writes
 
-        # Agar file already downloaded hai toh skip kare
-        if os.path.exists(save_path):
-            print(f"Already downloaded: {filename}")
-            continue
+# Binance kline CSV columns ("timestamp" = open time in ms, jaise backtest read_data expect karta hai)
+KLINE_COLUMNS = [
+    "timestamp", "open", "high", "low", "close", "volume",
+    "close_time", "quote_volume", "count",
+    "taker_buy_volume", "taker_buy_quote_volume", "ignore",
+]
 
+
+def zip_to_parquet(zip_path):
+    parquet_path = zip_path.replace(".zip", ".parquet")
+    if os.path.exists(parquet_path):
+        return parquet_path
+    try:
+        with zipfile.ZipFile(zip_path) as z:
+            name = z.namelist()[0]
+            # naye monthly files me header row hota hai, purane me nahi
+            with z.open(name) as f:
+                has_header = f.readline().startswith(b"open_time")
+            with z.open(name) as f:
+                tbl = pacsv.read_csv(
+                    f,
+                    read_options=pacsv.ReadOptions(column_names=KLINE_COLUMNS, skip_rows=int(has_header)),
+                    convert_options=pacsv.ConvertOptions(column_types={"timestamp": pa.int64()}),
+                )
+    except zipfile.BadZipFile:
+        # kharab/adhoori zip: hata do taaki agla run dobara download kare, baaki months chalte rahein
+        print(f"⚠️ Corrupt zip, deleted: {zip_path}")
+        os.remove(zip_path)
+        return None
+    pq.write_table(tbl, parquet_path, compression="zstd", use_dictionary=False)
+    print(f"📦 Parquet: {parquet_path}")
+    return parquet_path
+
+
+async def download_month(session, sem, year, month):
+    filename = f"BTCUSDT-5m-{year}-{month}.zip"
+    url = BASE_URL + filename
+    save_path = os.path.join(SAVE_DIR, filename)
+
+    # Agar file already downloaded hai toh skip kare
+    if os.path.exists(save_path):
+        print(f"Already downloaded: {filename}")
+        return save_path
+
+    async with sem:
         try:
             print(f"Downloading {filename} ...")
-            response = requests.get(url, stream=True, timeout=60)
-            if response.status_code == 200:
-                with open(save_path, "wb") as f:
-                    for chunk in response.iter_content(1024):
-                        f.write(chunk)
-                print(f"✅ Saved: {save_path}")
-            else:
-                print(f"❌ Not available: {filename}")
+            async with session.get(url) as response:
+                if response.status == 200:
+                    # pehle .part me likho, poora aane ke baad hi asli naam do
+                    tmp_path = save_path + ".part"
+                    with open(tmp_path, "wb") as f:
+                        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                            f.write(chunk)
+                    os.replace(tmp_path, save_path)
+                    print(f"✅ Saved: {save_path}")
+                    return save_path
+                else:
+                    print(f"❌ Not available: {filename}")
         except Exception as e:
             print(f"⚠️ Error downloading {filename}: {e}")
+    return None
+
+
+async def main():
+    sem = asyncio.Semaphore(MAX_IN_FLIGHT)
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=60)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        paths = await asyncio.gather(*(download_month(session, sem, year, month)
+                                       for year in years for month in months))
+    return [p for p in paths if p]
+
+
+if __name__ == "__main__":
+    zip_paths = asyncio.run(main())
+    print("🎉 All downloads complete for 5 years BTCUSDT Futures 5m data!")
 
-print("🎉 All downloads complete for 5 years BTCUSDT Futures 5m data!")
+    # CSV parse CPU-bound hai aur har month alag hai: saare cores pe parquet banao
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as ex:
+        list(ex.map(zip_to_parquet, zip_paths))
+    print("🎉 Parquet conversion complete!")
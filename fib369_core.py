@@ -0,0 +1,38 @@
+"""
+Fib 36.90% Strategy - shared setup math
+Used by both the backtest (backtest_strategy.py) and the live MT5 script so the
+swing/fib levels can never drift apart.
+"""
+
+import numpy as np
+
+SELL, BUY = 0, 1
+
+
+def setup_levels(start_price, max_price, min_price, move_pct, trigger_level, tp_level):
+    """
+    SELL/BUY setups for one bar or a whole batch of bars in one vectorized pass.
+    Returns ok[..., side] and levels[..., side, (trigger, tp, sl)].
+    """
+    start_price = np.asarray(start_price)
+    up_range = np.asarray(max_price - start_price)
+    down_range = np.asarray(start_price - min_price)
+    swing_high = np.asarray(max_price, dtype=np.float64)
+    swing_low = np.asarray(min_price, dtype=np.float64)
+
+    ok = np.empty(start_price.shape + (2,), dtype=np.bool_)
+    ok[..., SELL] = (up_range / start_price).astype(np.float64) >= move_pct
+    ok[..., BUY] = (down_range / start_price).astype(np.float64) >= move_pct
+
+    up_range = up_range.astype(np.float64)
+    down_range = down_range.astype(np.float64)
+    levels = np.empty(start_price.shape + (2, 3), dtype=np.float64)
+    # SELL setup (UP move): retrace down from the swing high
+    levels[..., SELL, 0] = swing_high - up_range * trigger_level
+    levels[..., SELL, 1] = swing_high - up_range * tp_level
+    levels[..., SELL, 2] = swing_high * 1.001
+    # BUY setup (DOWN move): retrace up from the swing low
+    levels[..., BUY, 0] = swing_low + down_range * trigger_level
+    levels[..., BUY, 1] = swing_low + down_range * tp_level
+    levels[..., BUY, 2] = swing_low * 0.999
+    return ok, levels
@@ -19,6 +19,8 @@ import pandas as pd
 import requests
 import schedule
 
+from fib369_core import SELL, BUY, setup_levels
+
 # ---------------- CONFIG ----------------
 SYMBOL = "BTCUSDm"
 INITIAL_BALANCE = 1000.0
@@ -37,6 +39,9 @@ DAILY_SUMMARY = OUTDIR / "daily_summary.csv"
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID", "")
 
+# today's trade count, kept in memory (trades log is only read on date rollover)
+_state = {"date": None, "count": 0}
+
 # ---------------- HELPERS ----------------
 def send_telegram(text):
     if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
@@ -55,6 +60,13 @@ def log_trade(row):
         if write_header: writer.writeheader()
         writer.writerow(row)
 
+def trades_today_count(today):
+    if _state["date"] != today:
+        # new day (or fresh start): seed once from the log so restarts still see earlier trades
+        count = pd.read_csv(TRADES_CSV)["datetime"].str[:10].eq(str(today)).sum() if TRADES_CSV.exists() else 0
+        _state["date"], _state["count"] = today, int(count)
+    return _state["count"]
+
 def append_summary(date_str, pnl):
     write_header = not DAILY_SUMMARY.exists()
     with open(DAILY_SUMMARY, "a", newline="") as f:
@@ -112,40 +124,34 @@ def run_strategy(live=True):
     if not any((now.hour==h and now.minute==m) for h,m in TRADE_HOURS): return
 
     equity = INITIAL_BALANCE
-    trades_today = pd.read_csv(TRADES_CSV)["datetime"].str[:10].eq(str(today)).sum() if TRADES_CSV.exists() else 0
-    if trades_today>0: return
+    if trades_today_count(today)>0: return
 
-    start_price = df.iloc[-1]["close"]
-    window = df.iloc[-50:]
-    max_price, min_price = window["high"].max(), window["low"].min()
+    close, high, low = (df[c].to_numpy() for c in ("close", "high", "low"))
+    start_price = close[-1]
+    max_price, min_price = high[-50:].max(), low[-50:].min()
+    ok, levels = setup_levels(start_price, max_price, min_price, MOVE_PCT, TRIGGER_LEVEL, TP_LEVEL)
 
     # SELL setup
-    if (max_price - start_price)/start_price >= MOVE_PCT:
-        swing_low, swing_high = start_price, max_price
-        fib_range = swing_high - swing_low
-        trigger = swing_high - fib_range*TRIGGER_LEVEL
-        tp = swing_high - fib_range*TP_LEVEL
-        sl = swing_high*1.001
+    if ok[SELL]:
+        trigger, tp, sl = levels[SELL]
         entry = trigger
         risk = abs(sl-entry)
         lots = (equity*RISK_PER_TRADE)/risk if risk>0 else 0.01
         res = place_order("SELL", lots, sl, tp, live)
         send_telegram(f"📉 SELL placed {entry} sl={sl} tp={tp} lots={lots}")
         log_trade({"datetime":now,"side":"SELL","entry":entry,"sl":sl,"tp":tp,"exit":"","pnl":"","reason":"opened"})
+        _state["count"] += 1
 
     # BUY setup
-    if (start_price - min_price)/start_price >= MOVE_PCT:
-        swing_high, swing_low = start_price, min_price
-        fib_range = swing_high - swing_low
-        trigger = swing_low + fib_range*TRIGGER_LEVEL
-        tp = swing_low + fib_range*TP_LEVEL
-        sl = swing_low*0.999
+    if ok[BUY]:
+        trigger, tp, sl = levels[BUY]
         entry = trigger
         risk = abs(entry-sl)
         lots = (equity*RISK_PER_TRADE)/risk if risk>0 else 0.01
         res = place_order("BUY", lots, sl, tp, live)
         send_telegram(f"📈 BUY placed {entry} sl={sl} tp={tp} lots={lots}")
         log_trade({"datetime":now,"side":"BUY","entry":entry,"sl":sl,"tp":tp,"exit":"","pnl":"","reason":"opened"})
+        _state["count"] += 1
 
 def daily_summary():
     today = dt.date.today().isoformat()
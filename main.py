@@ -1,15 +1,17 @@
-<<<<<<< HEAD
-import os, time, pickle, logging, requests, random
-from io import BufferedReader
+import os, time, json, hashlib, mmap, logging, requests, random, subprocess
+import ijson
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import BytesIO
 from pathlib import Path
 from dotenv import load_dotenv
-from moviepy.editor import VideoFileClip, AudioFileClip
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build_from_document
 from googleapiclient.http import MediaFileUpload
-from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
 from PIL import Image, ImageDraw, ImageFont
-import praw
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # ---------------- CONFIG ----------------
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
@@ -33,11 +35,40 @@ TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
 # YouTube API
 CLIENT_SECRETS_FILE = "client_secret.json"
-TOKEN_PICKLE = "token.pickle"
+TOKEN_JSON = Path("token.json")
+TOKEN_PICKLE = Path("token.pickle")  # old format, migrated once
 SCOPES = ["https://www.googleapis.com/auth/youtube.upload"]
+UPLOAD_CHUNK = 1024 * 1024  # resumable chunk (multiple of 256 KiB)
+UPLOAD_RETRIES = 5
+DISCOVERY_URL = "https://youtube.googleapis.com/$discovery/rest?version=v3"
+DISCOVERY_TTL = 7 * 24 * 3600  # weekly refresh
+
+# NVENC for 15s Shorts: p4 + low-latency tune, VBR capped for YouTube, no B-frames
+NVENC_PARAMS = ["-preset", "p4", "-tune", "ll", "-rc", "vbr", "-cq", "23",
+                "-b:v", "6M", "-maxrate", "10M", "-bufsize", "12M", "-bf", "0"]
+
+# Ek ffmpeg run me itne clips encode, baaki agle runs me upload
+BATCH_SIZE = 3
 
 TMP = Path("tmp")
 TMP.mkdir(exist_ok=True)
+DISCOVERY_CACHE = TMP / "youtube_v3_discovery.json"
+
+# API responses / mp3 ka disk cache (sha1(key) filenames)
+CACHE_DIR = TMP / "cache"
+CACHE_DIR.mkdir(exist_ok=True)
+FREESOUND_TTL = 24 * 3600
+
+# Thumbnail font: TTF ek hi baar parse hota hai
+try:
+    THUMB_FONT = ImageFont.truetype("arial.ttf", 70)
+except OSError:
+    THUMB_FONT = ImageFont.load_default()
+
+# keep-alive: saare API calls ek hi connection pool share karte hain
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=8,
+                                      max_retries=Retry(total=3, backoff_factor=0.5)))
 
 
 # ---------------- HELPERS ----------------
@@ -45,37 +76,82 @@ def notify(msg: str):
     if TELEGRAM_TOKEN and TELEGRAM_CHAT_ID:
         url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
         try:
-            requests.post(url, data={"chat_id": TELEGRAM_CHAT_ID, "text": msg}, timeout=5)
+            SESSION.post(url, data={"chat_id": TELEGRAM_CHAT_ID, "text": msg}, timeout=5)
         except Exception as e:
             logging.warning(f"Telegram notify failed: {e}")
 
 
+def youtube_discovery_doc():
+    # Discovery doc disk pe cache; har run pe googleapis.com hit nahi hota
+    fresh = DISCOVERY_CACHE.exists() and time.time() - DISCOVERY_CACHE.stat().st_mtime < DISCOVERY_TTL
+    if not fresh:
+        try:
+            r = SESSION.get(DISCOVERY_URL, timeout=15)
+            r.raise_for_status()
+            DISCOVERY_CACHE.write_text(r.text, encoding="utf-8")
+        except Exception as e:
+            if not DISCOVERY_CACHE.exists():
+                raise
+            logging.warning(f"Discovery refresh failed, using cached copy: {e}")
+    return DISCOVERY_CACHE.read_text(encoding="utf-8")
+
+
 def get_youtube_service():
     creds = None
-    if Path(TOKEN_PICKLE).exists():
-        f: BufferedReader
+    if TOKEN_JSON.exists():
+        creds = Credentials.from_authorized_user_info(json.loads(TOKEN_JSON.read_text()), SCOPES)
+    elif TOKEN_PICKLE.exists():
+        # purana token.pickle: ek baar load karke token.json me likh do
+        import pickle
         with open(TOKEN_PICKLE, "rb") as f:
             creds = pickle.load(f)
+        TOKEN_JSON.write_text(creds.to_json())
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
             creds.refresh(Request())
         else:
+            from google_auth_oauthlib.flow import InstalledAppFlow  # sirf first-run auth pe chahiye
             flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRETS_FILE, SCOPES)
             creds = flow.run_local_server(port=0)
-        with open(TOKEN_PICKLE, "wb") as f:
-            pickle.dump(creds, f)
-    return build("youtube", "v3", credentials=creds)
+        TOKEN_JSON.write_text(creds.to_json())
+    return build_from_document(youtube_discovery_doc(), credentials=creds)
 
 
 # ---------------- CONTENT FETCH ----------------
-def fetch_reddit_video(subs="funny+memes+videos", limit=30):
+def fetch_reddit_videos(subs="funny+memes+videos", limit=30, count=BATCH_SIZE):
+    import praw  # lazy: pending clip wale runs me load nahi hota
     reddit = praw.Reddit(client_id=REDDIT_CLIENT_ID,
                          client_secret=REDDIT_SECRET,
                          user_agent=REDDIT_USER_AGENT)
+    picks = []
     for post in reddit.subreddit(subs).hot(limit=limit):
         if post.is_video and not post.stickied:
-            return post.title, post.media["reddit_video"]["fallback_url"]
-    return None, None
+            url = post.media["reddit_video"]["fallback_url"]
+            picks.append((post.score, post.title, url, reddit_audio_url(url)))
+            if len(picks) == count:
+                break
+    # best (highest score) pehle
+    picks.sort(key=lambda p: p[0], reverse=True)
+    return [(title, url, audio_url) for _, title, url, audio_url in picks]
+
+
+def reddit_audio_url(fallback_url):
+    # fallback_url sirf video-only DASH stream hai; audio same folder me alag file
+    base = fallback_url.split("?")[0].rsplit("/", 1)[0]
+    for name in ("DASH_AUDIO_128.mp4", "DASH_audio.mp4"):
+        try:
+            if SESSION.head(f"{base}/{name}", timeout=10, allow_redirects=True).ok:
+                return f"{base}/{name}"
+        except Exception:
+            pass
+    return None  # silent post
+
+
+def stream_json_items(url, prefix, **kwargs):
+    # ijson: sirf prefix wale fields parse hote hain, poora JSON tree memory me nahi banta
+    with SESSION.get(url, stream=True, timeout=15, **kwargs) as r:
+        r.raw.decode_content = True
+        return list(ijson.items(r.raw, prefix))
 
 
 def fetch_pixabay_video():
@@ -83,11 +159,9 @@ def fetch_pixabay_video():
         return None
     url = f"https://pixabay.com/api/videos/?key={PIXABAY_KEY}&q=trending&per_page=10"
     try:
-        r = requests.get(url, timeout=15).json()
-        hits = r.get("hits", [])
-        if hits:
-            v = random.choice(hits)
-            return "Pixabay Viral Clip", v["videos"]["medium"]["url"]
+        urls = stream_json_items(url, "hits.item.videos.medium.url")
+        if urls:
+            return "Pixabay Viral Clip", random.choice(urls), None
     except Exception as e:
         logging.warning(f"Pixabay fetch failed: {e}")
     return None
@@ -99,333 +173,251 @@ def fetch_pexels_video():
     url = "https://api.pexels.com/videos/search?query=trending&per_page=10"
     try:
         headers = {"Authorization": PEXELS_KEY}
-        r = requests.get(url, headers=headers, timeout=15).json()
-        vids = r.get("videos", [])
-        if vids:
-            pick = random.choice(vids)
-            return "Pexels Viral Clip", pick["video_files"][0]["link"]
+        files = stream_json_items(url, "videos.item.video_files", headers=headers)
+        if files:
+            return "Pexels Viral Clip", random.choice(files)[0]["link"], None
     except Exception as e:
         logging.warning(f"Pexels fetch failed: {e}")
     return None
 
 
-def fetch_freesound_audio():
+def cache_path(key, suffix=".json"):
+    return CACHE_DIR / (hashlib.sha1(key.encode()).hexdigest() + suffix)
+
+
+def cache_get(key, ttl, suffix=".json"):
+    # fresh cached file ka path, warna None
+    path = cache_path(key, suffix)
+    if path.exists() and time.time() - path.stat().st_mtime < ttl:
+        return path
+    return None
+
+
+def cache_put(key, data: bytes, suffix=".json"):
+    path = cache_path(key, suffix)
+    tmp = path.with_suffix(path.suffix + ".part")
+    tmp.write_bytes(data)
+    tmp.replace(path)
+    return path
+
+
+def fetch_freesound_audio(query="beat"):
     if not FREESOUND_KEY:
         return None
     url = "https://freesound.org/apiv2/search/text/"
     try:
-        r = requests.get(url, params={"query": "beat", "page_size": 10},
-                         headers={"Authorization": f"Token {FREESOUND_KEY}"}, timeout=15).json()
-        if r.get("results"):
-            pick = random.choice(r["results"])
-            audio_url = pick["previews"]["preview-hq-mp3"]
-            path = TMP / "music.mp3"
-            res = requests.get(audio_url, timeout=15)
-            path.write_bytes(res.content)
+        # search results + mp3 dono 24h cache; har 3h cycle pe API/download nahi
+        key = f"freesound:{query}"
+        cached = cache_get(key, FREESOUND_TTL)
+        if cached:
+            previews = json.loads(cached.read_text())
+        else:
+            previews = stream_json_items(url, "results.item.previews.preview-hq-mp3",
+                                         params={"query": query, "page_size": 10},
+                                         headers={"Authorization": f"Token {FREESOUND_KEY}"})
+            if previews:
+                cache_put(key, json.dumps(previews).encode())
+        if previews:
+            audio_url = random.choice(previews)
+            path = cache_get(audio_url, FREESOUND_TTL, suffix=".mp3")
+            if not path:
+                res = SESSION.get(audio_url, timeout=15)
+                res.raise_for_status()
+                path = cache_put(audio_url, res.content, suffix=".mp3")
             return str(path)
     except Exception as e:
         logging.warning(f"Freesound fetch failed: {e}")
     return None
 
 
-# ---------------- VIDEO ----------------
-def download_video(url: str, out_path: Path):
+def fetch_any_video():
+    # Teeno sources ek saath; priority (Reddit > Pixabay > Pexels) wahi rehti hai.
+    # Returns [(title, video_url, audio_url), ...], best candidate pehle.
+    sources = [fetch_reddit_videos, fetch_pixabay_video, fetch_pexels_video]
+    ex = ThreadPoolExecutor(max_workers=len(sources))
+    futures = [ex.submit(fetch) for fetch in sources]
+    results = {}
     try:
-        r = requests.get(url, stream=True, timeout=30)
-        r.raise_for_status()
-        with open(out_path, "wb") as f:
-            for chunk in r.iter_content(1024 * 1024):
-                f.write(chunk)
-        return True
-    except Exception as e:
-        logging.error(f"Download failed: {e}")
-        return False
-
-
-def mix_video_music(video_path: Path, audio_path: Path, duration=15):
-    clip = VideoFileClip(str(video_path)).subclip(0, duration).resize((1080, 1920))
-    if audio_path and Path(audio_path).exists():
-        audio = AudioFileClip(str(audio_path)).subclip(0, duration)
-        clip = clip.set_audio(audio)
-    out = TMP / f"final_{int(time.time())}.mp4"
-    clip.write_videofile(str(out), fps=24, codec="libx264", audio_codec="aac", threads=2)
-    return str(out)
+        for done in as_completed(futures):
+            try:
+                found = done.result()
+            except Exception as e:
+                logging.warning(f"Video fetch failed: {e}")
+                found = None
+            results[done] = found if isinstance(found, list) else [found] if found else []
+            for fut in futures:
+                if fut not in results:
+                    break  # higher-priority source abhi pending hai
+                if results[fut]:
+                    return results[fut]
+    finally:
+        ex.shutdown(wait=False, cancel_futures=True)
+    return []
 
 
-def make_thumbnail(video_path, title, out_path="thumb.jpg"):
+# ---------------- VIDEO ----------------
+@lru_cache(maxsize=None)
+def _ffmpeg_supports(flag, name):
+    # ffmpeg -encoders / -hwaccels sirf ek baar parse karo, result cache
     try:
-        clip = VideoFileClip(video_path)
-        frame = clip.get_frame(clip.duration / 2)
-        img = Image.fromarray(frame)
-
-        draw = ImageDraw.Draw(img)
-        try:
-            font = ImageFont.truetype("arial.ttf", 70)
-        except:
-            font = ImageFont.load_default()
-
-        text = title[:40] + ("\n" + title[40:80] if len(title) > 40 else "")
-        w, h = draw.textsize(text, font=font)
-        x = (img.width - w) / 2
-        y = img.height - h - 50
-
-        draw.rectangle([x-20, y-20, x+w+20, y+h+20], fill=(0, 0, 0, 180))
-        draw.text((x, y), text, font=font, fill="white")
-
-        img.save(out_path, "JPEG")
-        return out_path
-    except Exception as e:
-        logging.error(f"Thumbnail error: {e}")
-        return None
-
-
-# ---------------- UPLOAD ----------------
-def upload_video_to_youtube(service, video_path, title, description, tags=None, thumb_path=None):
-    body = {
-        "snippet": {"title": title, "description": description, "tags": tags or [], "categoryId": "23"},
-        "status": {"privacyStatus": "public"}
-    }
-    media = MediaFileUpload(video_path, chunksize=-1, resumable=True)
-    request = service.videos().insert(part="snippet,status", body=body, media_body=media)
-
-    response = None
-    while response is None:
-        status, response = request.next_chunk()
-
-    vid_id = response.get("id")
-    link = f"https://youtu.be/{vid_id}"
-
-    if thumb_path and Path(thumb_path).exists():
-        try:
-            service.thumbnails().set(videoId=vid_id, media_body=MediaFileUpload(thumb_path)).execute()
-        except Exception as e:
-            logging.warning(f"Thumbnail upload failed: {e}")
-
-    logging.info(f"✅ Uploaded: {link}")
-    notify(f"✅ Uploaded: {title}\n{link}")
-    return link
-
-
-# ---------------- MAIN ----------------
-def main():
-    global final_video
-    service = get_youtube_service()
-    notify("🚀 Bot started: uploading viral video...")
-
-    # 1. Try Reddit
-    title, url = fetch_reddit_video()
-    if not url:
-        # 2. Try Pixabay
-        alt = fetch_pixabay_video()
-        if alt:
-            title, url = alt
-        else:
-            # 3. Try Pexels
-            alt = fetch_pexels_video()
-            if alt:
-                title, url = alt
-            else:
-                notify("❌ No video found (Reddit/Pixabay/Pexels)")
-                return
-
-    # Download video
-    video_path = TMP / f"video_{int(time.time())}.mp4"
-    if not download_video(url, video_path):
-        notify("❌ Failed to download video")
-        return
-
-    # Add music
-    audio = fetch_freesound_audio()
-
-    # Final mix
-    final_video = mix_video_music(video_path, audio, duration=15)
-        
-    # Hindi + English Title
-    final_title = f"{title[:60]} | {title[:40]} 🔥 #shorts"
-    description = f"{title}\n\n{title} (हिंदी)\n\n#shorts #viral"
-
-    # Thumbnail
-    thumb_path = make_thumbnail(final_video, title)
-
-    # Upload
-    upload_video_to_youtube(service, final_video, final_title, description, thumb_path=thumb_path)
-
-
-if __name__ == "__main__":
-    while True:
-        main()
-        time.sleep(3 * 3600)  # every 3 hours
-=======
-import os, time, pickle, logging, requests, random
-from pathlib import Path
-from dotenv import load_dotenv
-from moviepy.editor import VideoFileClip, AudioFileClip
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from PIL import Image, ImageDraw, ImageFont
-import praw
-
-# ---------------- CONFIG ----------------
-logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
-load_dotenv("config.env")
-
-# Reddit API
-REDDIT_CLIENT_ID = os.getenv("REDDIT_CLIENT_ID")
-REDDIT_SECRET = os.getenv("REDDIT_SECRET")
-REDDIT_USER_AGENT = os.getenv("REDDIT_USER_AGENT")
-
-# Pixabay / Pexels API
-PIXABAY_KEY = os.getenv("PIXABAY_KEY")
-PEXELS_KEY = os.getenv("PEXELS_KEY")
-
-# Freesound API
-FREESOUND_KEY = os.getenv("FREESOUND_KEY")
-
-# Telegram API
-TELEGRAM_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
-
-# YouTube API
-CLIENT_SECRETS_FILE = "client_secret.json"
-TOKEN_PICKLE = "token.pickle"
-SCOPES = ["https://www.googleapis.com/auth/youtube.upload"]
-
-TMP = Path("tmp")
-TMP.mkdir(exist_ok=True)
-
-
-# ---------------- HELPERS ----------------
-def notify(msg: str):
-    if TELEGRAM_TOKEN and TELEGRAM_CHAT_ID:
-        url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-        try:
-            requests.post(url, data={"chat_id": TELEGRAM_CHAT_ID, "text": msg}, timeout=5)
-        except Exception as e:
-            logging.warning(f"Telegram notify failed: {e}")
-
-
-def get_youtube_service():
-    creds = None
-    if Path(TOKEN_PICKLE).exists():
-        with open(TOKEN_PICKLE, "rb") as f:
-            creds = pickle.load(f)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRETS_FILE, SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open(TOKEN_PICKLE, "wb") as f:
-            pickle.dump(creds, f)
-    return build("youtube", "v3", credentials=creds)
+        out = subprocess.run(["ffmpeg", "-hide_banner", flag],
+                             capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return False
+    return name in out.split()
 
 
-# ---------------- CONTENT FETCH ----------------
-def fetch_reddit_video(subs="funny+memes+videos", limit=30):
-    reddit = praw.Reddit(client_id=REDDIT_CLIENT_ID,
-                         client_secret=REDDIT_SECRET,
-                         user_agent=REDDIT_USER_AGENT)
-    for post in reddit.subreddit(subs).hot(limit=limit):
-        if post.is_video and not post.stickied:
-            return post.title, post.media["reddit_video"]["fallback_url"]
-    return None, None
+@lru_cache(maxsize=None)
+def _ffmpeg_runs(*args):
+    # chhota sa asli ffmpeg run: build me feature hona != GPU/driver maujood hona
+    try:
+        subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error", *args],
+                       capture_output=True, check=True, timeout=30)
+    except (OSError, subprocess.SubprocessError):
+        return False
+    return True
 
 
-def fetch_pixabay_video():
-    if not PIXABAY_KEY:
-        return None
-    url = f"https://pixabay.com/api/videos/?key={PIXABAY_KEY}&q=trending&per_page=10"
-    try:
-        r = requests.get(url, timeout=15).json()
-        hits = r.get("hits", [])
-        if hits:
-            v = random.choice(hits)
-            return "Pixabay Viral Clip", v["videos"]["medium"]["url"]
-    except Exception as e:
-        logging.warning(f"Pixabay fetch failed: {e}")
-    return None
+def _nvenc_available():
+    # distro ffmpeg h264_nvenc list karta hai CPU-only host pe bhi; ek frame encode karke dekho
+    return _ffmpeg_supports("-encoders", "h264_nvenc") and _ffmpeg_runs(
+        "-f", "lavfi", "-i", "color=s=256x256:d=0.1", "-c:v", "h264_nvenc", "-f", "null", "-")
 
 
-def fetch_pexels_video():
-    if not PEXELS_KEY:
-        return None
-    url = "https://api.pexels.com/videos/search?query=trending&per_page=10"
-    try:
-        headers = {"Authorization": PEXELS_KEY}
-        r = requests.get(url, headers=headers, timeout=15).json()
-        vids = r.get("videos", [])
-        if vids:
-            pick = random.choice(vids)
-            return "Pexels Viral Clip", pick["video_files"][0]["link"]
-    except Exception as e:
-        logging.warning(f"Pexels fetch failed: {e}")
-    return None
+def _nvdec_available():
+    # "-hwaccels" me cuda sirf build batata hai; asli CUDA device init + scale_cuda run karke dekho
+    return _ffmpeg_supports("-hwaccels", "cuda") and _ffmpeg_runs(
+        "-init_hw_device", "cuda=cu", "-filter_hw_device", "cu",
+        "-f", "lavfi", "-i", "color=s=256x256:d=0.1",
+        "-vf", "format=nv12,hwupload,scale_cuda=128:128,hwdownload,format=nv12", "-f", "null", "-")
 
 
-def fetch_freesound_audio():
-    if not FREESOUND_KEY:
-        return None
-    url = "https://freesound.org/apiv2/search/text/"
-    try:
-        r = requests.get(url, params={"query": "beat", "page_size": 10},
-                         headers={"Authorization": f"Token {FREESOUND_KEY}"}, timeout=15).json()
-        if r.get("results"):
-            pick = random.choice(r["results"])
-            audio_url = pick["previews"]["preview-hq-mp3"]
-            path = TMP / "music.mp3"
-            res = requests.get(audio_url, timeout=15)
-            path.write_bytes(res.content)
-            return str(path)
-    except Exception as e:
-        logging.warning(f"Freesound fetch failed: {e}")
-    return None
+def _video_duration(video_path):
+    out = subprocess.run(["ffprobe", "-v", "error", "-show_entries", "format=duration",
+                          "-of", "default=nw=1:nk=1", str(video_path)],
+                         capture_output=True, text=True, check=True).stdout
+    return float(out)
 
 
-# ---------------- VIDEO ----------------
-def download_video(url: str, out_path: Path):
+def _is_shorts_ready(video):
+    # already 1080x1920 H.264 yuv420p? to video stream copy ho sakta hai, re-encode nahi
     try:
-        r = requests.get(url, stream=True, timeout=30)
-        r.raise_for_status()
-        with open(out_path, "wb") as f:
-            for chunk in r.iter_content(1024 * 1024):
-                f.write(chunk)
-        return True
-    except Exception as e:
-        logging.error(f"Download failed: {e}")
+        out = subprocess.run(["ffprobe", "-v", "error", "-select_streams", "v:0",
+                              "-show_entries", "stream=width,height,codec_name,pix_fmt",
+                              "-of", "json", str(video)],
+                             capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
         return False
-
-
-def mix_video_music(video_path: Path, audio_path: Path, duration=15):
-    clip = VideoFileClip(str(video_path)).subclip(0, duration).resize((1080, 1920))
-    if audio_path and Path(audio_path).exists():
-        audio = AudioFileClip(str(audio_path)).subclip(0, duration)
-        clip = clip.set_audio(audio)
-    out = TMP / f"final_{int(time.time())}.mp4"
-    clip.write_videofile(str(out), fps=24, codec="libx264", audio_codec="aac", threads=2)
-    return str(out)
+    streams = json.loads(out).get("streams") or [{}]
+    s = streams[0]
+    return (s.get("codec_name"), s.get("width"), s.get("height"), s.get("pix_fmt")) == ("h264", 1080, 1920, "yuv420p")
+
+
+def mix_videos_music(sources, music_path: Path, duration=15, hw=True):
+    # sources: [(video, audio), ...] — local paths ya URLs; ffmpeg HTTP se seedha padhta hai,
+    # alag download step nahi. Saare clips ek hi ffmpeg run me: trim + scale + fps + audio mux,
+    # NVENC if present. Process startup / NVDEC init ek baar, N outputs.
+    nvenc = hw and _nvenc_available()
+    gpu = nvenc and _nvdec_available()
+    n = len(sources)
+    with ThreadPoolExecutor(max_workers=n) as ex:
+        copy = list(ex.map(_is_shorts_ready, [video for video, _ in sources]))
+    cmd = ["ffmpeg", "-y", "-loglevel", "error"]
+    inputs = 0
+
+    def add_input(src, decode=False):
+        nonlocal cmd, inputs
+        if str(src).startswith("http"):
+            cmd += ["-reconnect", "1", "-reconnect_streamed", "1"]
+        if decode and gpu:
+            # NVDEC decode + CUDA scale: frames GPU memory me hi rehte hain
+            cmd += ["-hwaccel", "cuda", "-hwaccel_output_format", "cuda"]
+        cmd += ["-i", str(src)]
+        inputs += 1
+        return inputs - 1
+
+    video_idx = [add_input(video, decode=not c) for (video, _), c in zip(sources, copy)]
+    # square pixels + yuv420p, jaise MoviePy ka resize/libx264 output deta tha
+    scale = "scale_cuda=1080:1920,setsar=1" if gpu else "scale=1080:1920,setsar=1,format=yuv420p"
+    graph = [f"[{v}:v]trim=0:{duration},setpts=PTS-STARTPTS,{scale},fps=24[v{i}]"
+             for i, (v, c) in enumerate(zip(video_idx, copy)) if not c]
+    music = music_path and Path(music_path).exists()
+    if music:
+        m = add_input(music_path)
+        splits = "".join(f"[a{i}]" for i in range(n))
+        graph.append(f"[{m}:a]atrim=0:{duration},asetpts=PTS-STARTPTS,asplit={n}{splits}")
+        audio_maps = [f"[a{i}]" for i in range(n)]
+    else:
+        # music nahi mila: clip ka apna audio — Reddit ka DASH audio ya file ka audio track (agar hai)
+        audio_maps = [f"{add_input(audio)}:a:0" if audio else f"{v}:a?"
+                      for (_, audio), v in zip(sources, video_idx)]
+    if graph:
+        cmd += ["-filter_complex", ";".join(graph)]
+
+    if nvenc:
+        vcodec = ["-c:v", "h264_nvenc"] + NVENC_PARAMS
+    else:
+        vcodec = ["-c:v", "libx264", "-threads", "2"]
+    stamp = int(time.time())
+    outs = []
+    for i in range(n):
+        out = TMP / f"final_{stamp}_{i}.mp4"
+        if copy[i]:
+            # stream copy: sirf remux + -t trim; audio (music/DASH) fir bhi aac me
+            cmd += ["-map", f"{video_idx[i]}:v:0", "-c:v", "copy"]
+        else:
+            cmd += ["-map", f"[v{i}]"] + vcodec
+        cmd += ["-map", audio_maps[i], "-t", str(duration), "-c:a", "aac", str(out)]
+        outs.append(str(out))
+    try:
+        subprocess.run(cmd, check=True)
+    except subprocess.CalledProcessError as e:
+        if not nvenc:
+            raise
+        # GPU run fail (driver/session limit/...): wahi mix CPU pe, libx264 ke saath
+        logging.warning(f"NVENC encode failed, retrying on CPU: {e}")
+        return mix_videos_music(sources, music_path, duration, hw=False)
+    return outs
+
+
+def _grab_frame(video_path, at):
+    # -ss before -i: keyframe pe seek, sirf ek frame decode + pipe hota hai
+    for gpu in ((True, False) if _nvdec_available() else (False,)):
+        cmd = ["ffmpeg", "-loglevel", "error", "-ss", str(at)]
+        if gpu:
+            cmd += ["-hwaccel", "cuda", "-hwaccel_output_format", "cuda"]
+        cmd += ["-i", str(video_path), "-frames:v", "1"]
+        if gpu:
+            cmd += ["-vf", "hwdownload,format=nv12"]
+        cmd += ["-f", "image2pipe", "-c:v", "png", "-"]
+        try:
+            png = subprocess.run(cmd, capture_output=True, check=True).stdout
+        except subprocess.CalledProcessError as e:
+            if not gpu:
+                raise
+            # CUDA decode fail (codec/driver): wahi frame CPU pe
+            logging.warning(f"NVDEC frame grab failed, retrying on CPU: {e.stderr.decode(errors='replace').strip()}")
+            continue
+        return Image.open(BytesIO(png)).convert("RGB")
 
 
 def make_thumbnail(video_path, title, out_path="thumb.jpg"):
     try:
-        clip = VideoFileClip(video_path)
-        frame = clip.get_frame(clip.duration / 2)
-        img = Image.fromarray(frame)
+        img = _grab_frame(video_path, _video_duration(video_path) / 2)
 
         draw = ImageDraw.Draw(img)
-        try:
-            font = ImageFont.truetype("arial.ttf", 70)
-        except:
-            font = ImageFont.load_default()
 
         text = title[:40] + ("\n" + title[40:80] if len(title) > 40 else "")
-        w, h = draw.textsize(text, font=font)
+        left, top, right, bottom = draw.multiline_textbbox((0, 0), text, font=THUMB_FONT)
+        w, h = right - left, bottom - top
         x = (img.width - w) / 2
         y = img.height - h - 50
 
-        draw.rectangle([x-20, y-20, x+w+20, y+h+20], fill=(0, 0, 0, 180))
-        draw.text((x, y), text, font=font, fill="white")
+        # semi-transparent box: RGB image pe alpha ignore ho jata tha, isliye RGBA overlay composite
+        overlay = Image.new("RGBA", img.size, (0, 0, 0, 0))
+        ImageDraw.Draw(overlay).rectangle([x-20, y-20, x+w+20, y+h+20], fill=(0, 0, 0, 180))
+        img = Image.alpha_composite(img.convert("RGBA"), overlay).convert("RGB")
+        ImageDraw.Draw(img).text((x, y), text, font=THUMB_FONT, fill="white")
 
         img.save(out_path, "JPEG")
         return out_path
@@ -435,24 +427,47 @@ def make_thumbnail(video_path, title, out_path="thumb.jpg"):
 
 
 # ---------------- UPLOAD ----------------
+class MmapFileUpload(MediaFileUpload):
+    """MediaFileUpload whose resumable chunks are slices of one read-only mmap of the file."""
+
+    def __init__(self, filename, **kwargs):
+        super().__init__(filename, **kwargs)
+        self._mmap = mmap.mmap(self._fd.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def has_stream(self):
+        # False => next_chunk() calls getbytes() instead of seek+read via _StreamSlice
+        return False
+
+    def getbytes(self, begin, length):
+        return self._mmap[begin:begin + length]
+
+    def __del__(self):
+        # __init__ may have failed before the mmap existed (e.g. empty file); still close _fd
+        m = getattr(self, "_mmap", None)
+        if m is not None:
+            m.close()
+        super().__del__()
+
+
 def upload_video_to_youtube(service, video_path, title, description, tags=None, thumb_path=None):
     body = {
         "snippet": {"title": title, "description": description, "tags": tags or [], "categoryId": "23"},
         "status": {"privacyStatus": "public"}
     }
-    media = MediaFileUpload(video_path, chunksize=-1, resumable=True)
+    media = MmapFileUpload(video_path, chunksize=UPLOAD_CHUNK, resumable=True, mimetype="video/mp4")
     request = service.videos().insert(part="snippet,status", body=body, media_body=media)
 
+    # 1 MiB chunks; har chunk 5xx/429 pe exponential backoff ke saath retry hota hai
     response = None
     while response is None:
-        status, response = request.next_chunk()
+        status, response = request.next_chunk(num_retries=UPLOAD_RETRIES)
 
     vid_id = response.get("id")
     link = f"https://youtu.be/{vid_id}"
 
     if thumb_path and Path(thumb_path).exists():
         try:
-            service.thumbnails().set(videoId=vid_id, media_body=MediaFileUpload(thumb_path)).execute()
+            service.thumbnails().set(videoId=vid_id, media_body=MediaFileUpload(thumb_path, mimetype="image/jpeg")).execute()
         except Exception as e:
             logging.warning(f"Thumbnail upload failed: {e}")
 
@@ -462,37 +477,56 @@ def upload_video_to_youtube(service, video_path, title, description, tags=None,
 
 
 # ---------------- MAIN ----------------
+# Encoded but not yet uploaded clips from the last batch: [[title, final_video], ...]
+# Disk pe rakha hai kyunki har run ek alag process hai (systemd timer / cron).
+PENDING_FILE = TMP / "pending.json"
+
+
+def load_pending():
+    if not PENDING_FILE.exists():
+        return []
+    # jin clips ki file cleanup me ud gayi, unhe skip
+    return [clip for clip in json.loads(PENDING_FILE.read_text(encoding="utf-8")) if Path(clip[1]).exists()]
+
+
+def save_pending(pending):
+    PENDING_FILE.write_text(json.dumps(pending, ensure_ascii=False), encoding="utf-8")
+
+
 def main():
+    global final_video
     service = get_youtube_service()
     notify("🚀 Bot started: uploading viral video...")
 
-    # 1. Try Reddit
-    title, url = fetch_reddit_video()
-    if not url:
-        # 2. Try Pixabay
-        alt = fetch_pixabay_video()
-        if alt:
-            title, url = alt
-        else:
-            # 3. Try Pexels
-            alt = fetch_pexels_video()
-            if alt:
-                title, url = alt
-            else:
-                notify("❌ No video found (Reddit/Pixabay/Pexels)")
-                return
-
-    # Download video
-    video_path = TMP / f"video_{int(time.time())}.mp4"
-    if not download_video(url, video_path):
-        notify("❌ Failed to download video")
-        return
-
-    # Add music
-    audio = fetch_freesound_audio()
-
-    # Final mix
-    final_video = mix_video_music(video_path, audio, duration=15)
+    pending = load_pending()
+    if pending:
+        # pichhle batch ka encoded clip, dobara download/encode nahi
+        title, final_video = pending.pop(0)
+        save_pending(pending)
+    else:
+        # Reddit / Pixabay / Pexels candidates + music, concurrently
+        with ThreadPoolExecutor(max_workers=1) as ex:
+            audio_job = ex.submit(fetch_freesound_audio)
+            clips = fetch_any_video()
+            audio = audio_job.result()
+        if not clips:
+            notify("❌ No video found (Reddit/Pixabay/Pexels)")
+            return
+
+        # Final mix: saare clips ek ffmpeg run me, seedha URLs se; fail ho to sirf top clip
+        finals = None
+        for batch in ((clips, clips[:1]) if len(clips) > 1 else (clips,)):
+            try:
+                finals = mix_videos_music([(url, src_audio) for _, url, src_audio in batch], audio, duration=15)
+                clips = batch
+                break
+            except subprocess.CalledProcessError as e:
+                logging.warning(f"Encode failed for {len(batch)} clip(s): {e}")
+        if not finals:
+            notify("❌ Failed to download video")
+            return
+        title, final_video = clips[0][0], finals[0]
+        save_pending(pending + [[clip[0], f] for clip, f in zip(clips[1:], finals[1:])])
 
     # Hindi + English Title
     final_title = f"{title[:60]} | {title[:40]} 🔥 #shorts"
@@ -506,7 +540,5 @@ def main():
 
 
 if __name__ == "__main__":
-    while True:
-        main()
-        time.sleep(3 * 3600)  # every 3 hours
-
+    # One upload per run; har 3 ghante systemd timer chalata hai (see systemd/)
+    main()
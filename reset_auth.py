@@ -1,6 +1,5 @@
 # reset_auth.py
 import os
-import pickle
 from pathlib import Path
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
@@ -9,23 +8,24 @@ from googleapiclient.discovery import build
 # Scope sirf YouTube upload ke liye
 SCOPES = ["https://www.googleapis.com/auth/youtube.upload"]
 CLIENT_SECRETS_FILE = "client_secret.json"
-TOKEN_PICKLE = Path("token.pickle")
+TOKEN_JSON = Path("token.json")
+TOKEN_PICKLE = Path("token.pickle")  # old format
 
 def reset_auth():
     # Purana token delete kar
-    if TOKEN_PICKLE.exists():
-        os.remove(TOKEN_PICKLE)
-        print("🗑️ Deleted old token.pickle")
+    for token in (TOKEN_JSON, TOKEN_PICKLE):
+        if token.exists():
+            os.remove(token)
+            print(f"🗑️ Deleted old {token}")
 
     # Naya token generate karo
     flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRETS_FILE, SCOPES)
     creds = flow.run_local_server(port=0)
 
     # Save kar lo naya token
-    with open(TOKEN_PICKLE, "wb") as f:
-        pickle.dump(creds, f)
+    TOKEN_JSON.write_text(creds.to_json())
 
-    print("✅ New token.pickle created with correct YouTube upload scope.")
+    print("✅ New token.json created with correct YouTube upload scope.")
 
     # Test service
     service = build("youtube", "v3", credentials=creds)
@@ -13,15 +13,27 @@ Full improved backtest for BTC strategy:
 
 import sys
 import os
-import math
+import glob
+import hashlib
 import argparse
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import warnings
 
-warnings.filterwarnings("ignore")
+try:
+    from numba import njit
+except ImportError:  # numba optional: the kernel then runs as plain Python (same results, slower)
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda f: f
+
+try:
+    from pyarrow.lib import ArrowException
+except ImportError:  # pyarrow optional: pandas then picks another parquet engine (or none)
+    ArrowException = ValueError
 
 # ---- CONFIG ----
 RISK_PER_TRADE = 0.06         # 6% of equity
@@ -39,306 +51,448 @@ DAILY_MAX_TRADES = 5
 DAILY_MAX_LOSS_PCT = 0.10     # stop trading for that day if equity loses 10%
 MIN_LOT = 0.001               # not used for crypto backtest but kept
 LOT_STEP = 0.001
+PRICE_DTYPE = np.float32      # storage for OHLC + indicators; equity/P&L stay float64
 
 # Time filter (optional): list of allowed hours (UTC). Empty => always allow
 # Example: trade only 10-16 UTC => allowed_hours = list(range(10,17))
 ALLOWED_HOURS = []  # [] => all day
 
+# Trade simulation horizon (bars after entry)
+MAX_HOLD_BARS = 1000
+
 # Output files
 TRADES_CSV = "trades_log.csv"
 EQUITY_PNG = "equity_curve.png"
 MONTHLY_CSV = "monthly_report.csv"
 
+# Parquet caches of parsed candles / indicators, one pair per input csv, valid while newer
+# than the csv. Kept in their own folder so input globs never pick them up.
+USE_CACHE = True
+CACHE_DIR = "backtest_cache"
+
 # ---- Helpers / Indicators ----
+# accepted input names per canonical column (case-insensitive), in priority order
+COLUMN_CANDIDATES = {
+    "open": ("open", "open_price"),
+    "high": ("high", "high_price"),
+    "low": ("low", "low_price"),
+    "close": ("close", "close_price", "close_time_close"),
+    "volume": ("volume", "base_volume", "vol"),
+}
+
 def load_csv(path):
-    df = pd.read_csv(path)
-    # Guess timestamp column
-    if "timestamp" in df.columns:
-        # epoch ms or s? detect
-        ts = df["timestamp"].iloc[0]
-        if ts > 1e12:
-            df["datetime"] = pd.to_datetime(df["timestamp"], unit="ms")
-        elif ts > 1e9:
-            df["datetime"] = pd.to_datetime(df["timestamp"], unit="s")
+    # mixed-type / datetime-format parse warnings are expected on raw exchange dumps
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        df = pd.read_csv(path)
+        # Guess timestamp column
+        if "timestamp" in df.columns:
+            # epoch ms or s? detect
+            ts = df["timestamp"].to_numpy()
+            if ts[0] > 1e12:
+                df["datetime"] = pd.to_datetime(ts, unit="ms")
+            elif ts[0] > 1e9:
+                df["datetime"] = pd.to_datetime(ts, unit="s")
+            else:
+                # fallback: try direct parse
+                df["datetime"] = pd.to_datetime(df["timestamp"])
+        elif "open_time" in df.columns:
+            df["datetime"] = pd.to_datetime(df["open_time"], unit="ms", errors="coerce")
+        elif "close_time" in df.columns:
+            df["datetime"] = pd.to_datetime(df["close_time"], unit="ms", errors="coerce")
+        elif "date" in df.columns or "datetime" in df.columns:
+            key = "datetime" if "datetime" in df.columns else "date"
+            df["datetime"] = pd.to_datetime(df[key])
         else:
-            # fallback: try direct parse
-            df["datetime"] = pd.to_datetime(df["timestamp"])
-    elif "open_time" in df.columns:
-        df["datetime"] = pd.to_datetime(df["open_time"], unit="ms", errors="coerce")
-    elif "close_time" in df.columns:
-        df["datetime"] = pd.to_datetime(df["close_time"], unit="ms", errors="coerce")
-    elif "date" in df.columns or "datetime" in df.columns:
-        key = "datetime" if "datetime" in df.columns else "date"
-        df["datetime"] = pd.to_datetime(df[key])
-    else:
-        raise RuntimeError("Could not find timestamp column (timestamp/open_time/close_time/datetime/date)")
+            raise RuntimeError("Could not find timestamp column (timestamp/open_time/close_time/datetime/date)")
 
-    # Normalize OHLC column names
-    colmap = {}
+    # Normalize OHLC column names: one source column per canonical name, first candidate wins
+    lower_cols = {}
     for c in df.columns:
-        low = c.lower()
-        if low in ("open","open_price"): colmap[c] = "open"
-        if low in ("high","high_price"): colmap[c] = "high"
-        if low in ("low","low_price"): colmap[c] = "low"
-        if low in ("close","close_price","close_time_close"): colmap[c] = "close"
-        if "volume" in low and "quote" not in low:
-            colmap[c] = "volume"
-    df = df.rename(columns=colmap)
-    required = ["open","high","low","close","datetime"]
-    for r in required:
-        if r not in df.columns:
+        lower_cols.setdefault(c.lower(), c)
+    source = {}
+    for canon, names in COLUMN_CANDIDATES.items():
+        for name in names:
+            if name in lower_cols:
+                source[canon] = lower_cols[name]
+                break
+    for r in ("open","high","low","close"):
+        if r not in source:
             raise RuntimeError(f"Required column '{r}' not found after mapping. Available cols: {df.columns.tolist()}")
-    df = df[["datetime","open","high","low","close"] + ([c for c in ("volume",) if c in df.columns])]
+    df = pd.DataFrame({"datetime": df["datetime"], **{canon: df[src] for canon, src in source.items()}})
     df = df.sort_values("datetime").reset_index(drop=True)
+    for c in ("open", "high", "low", "close"):
+        df[c] = df[c].astype(PRICE_DTYPE)
+    # integer calendar day per bar, so the backtest never touches Timestamp.date()
+    df["day_id"] = df["datetime"].to_numpy().astype("datetime64[D]").view("i8").astype(np.int32)
     return df
 
 def add_indicators(df):
-    df = df.copy()
-    df["ema50"] = df["close"].ewm(span=EMA_FAST, adjust=False).mean()
-    df["ema200"] = df["close"].ewm(span=EMA_SLOW, adjust=False).mean()
-    # RSI
-    delta = df["close"].diff()
-    gain = delta.clip(lower=0).rolling(window=RSI_PERIOD).mean()
-    loss = -delta.clip(upper=0).rolling(window=RSI_PERIOD).mean()
-    rs = gain / (loss.replace(0, np.nan))
-    df["rsi"] = 100 - (100 / (1 + rs))
-    # ATR
-    df["tr1"] = df["high"] - df["low"]
-    df["tr2"] = (df["high"] - df["close"].shift(1)).abs()
-    df["tr3"] = (df["low"] - df["close"].shift(1)).abs()
-    df["tr"] = df[["tr1","tr2","tr3"]].max(axis=1)
-    df["atr"] = df["tr"].rolling(window=ATR_PERIOD).mean()
-    df.drop(columns=["tr1","tr2","tr3","tr"], inplace=True)
+    """Adds the indicator columns to df in place (load_csv hands out a fresh frame) and returns it."""
+    # recursions run in float64 inside ewm_mean, results are stored as PRICE_DTYPE
+    h = df["high"].to_numpy()
+    l = df["low"].to_numpy()
+    c = df["close"].to_numpy()
+    df["ema50"] = ewm_mean(c, (EMA_FAST - 1) / 2).astype(PRICE_DTYPE)
+    df["ema200"] = ewm_mean(c, (EMA_SLOW - 1) / 2).astype(PRICE_DTYPE)
+    prev_c = np.empty_like(c)
+    prev_c[0] = np.nan
+    prev_c[1:] = c[:-1]
+    # RSI (Wilder smoothing)
+    delta = c - prev_c
+    gain = ewm_mean(np.where(delta > 0, delta, 0.0), RSI_PERIOD - 1)
+    loss = ewm_mean(np.where(delta < 0, -delta, 0.0), RSI_PERIOD - 1)
+    rs = gain / np.where(loss == 0, np.nan, loss)
+    df["rsi"] = (100 - (100 / (1 + rs))).astype(PRICE_DTYPE)
+    # ATR (Wilder smoothing); fmax skips the missing previous close on the first bar
+    tr = np.fmax.reduce([h - l, np.abs(h - prev_c), np.abs(l - prev_c)])
+    df["atr"] = ewm_mean(tr, ATR_PERIOD - 1).astype(PRICE_DTYPE)
+    # swings over the last SWING_LOOKBACK bars, same window as find_recent_swings
+    df["swing_high"], df["shi"], df["swing_low"], df["sli"] = rolling_argmax_min(
+        h, l, SWING_LOOKBACK)
+    return df
+
+def _fresh_cache(cache, src):
+    return USE_CACHE and os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(src)
+
+def _path_key(src):
+    # the path hash keeps same-named csvs from different folders apart
+    return hashlib.sha1(os.path.abspath(src).encode()).hexdigest()[:10]
+
+def _cache_file(src, tag):
+    return os.path.join(CACHE_DIR, f"{os.path.basename(src)}.{_path_key(src)}.{tag}.parquet")
+
+def _write_cache(df, cache):
+    # write-then-rename so an interrupted run never leaves a truncated parquet behind;
+    # an unwritable cache dir just means running uncached
+    tmp = cache + ".part"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, cache)
+    except (OSError, ValueError, ArrowException) as e:
+        # disk full / permissions, or a frame the parquet engine can't serialize
+        print(f"Cache not written ({e}), continuing without it")
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def load_csv_cached(path):
+    """load_csv, served from the parquet cache after the first parse."""
+    cache = _cache_file(path, np.dtype(PRICE_DTYPE).name)
+    if _fresh_cache(cache, path):
+        return pd.read_parquet(cache)
+    df = load_csv(path)
+    if USE_CACHE:
+        _write_cache(df, cache)
+    return df
+
+def load_with_indicators(path):
+    """load_csv + add_indicators; cached per indicator parameters, so changing them recomputes."""
+    params = (EMA_FAST, EMA_SLOW, RSI_PERIOD, ATR_PERIOD, SWING_LOOKBACK, np.dtype(PRICE_DTYPE).name)
+    cache = _cache_file(path, "ind-" + hashlib.sha1(repr(params).encode()).hexdigest()[:10])
+    if _fresh_cache(cache, path):
+        return pd.read_parquet(cache)
+    df = add_indicators(load_csv_cached(path))
+    if USE_CACHE:
+        _write_cache(df, cache)
     return df
 
+@njit(cache=True)
+def ewm_mean(x, com):
+    """Same recurrence (NaN handling included) as pd.Series(x).ewm(com=com, adjust=False).mean()."""
+    alpha = 1.0 / (1.0 + com)
+    out = np.empty(len(x))
+    # float(): float32 elements would keep the plain-Python fallback's recursion in float32
+    w = float(x[0])
+    out[0] = w
+    old_wt = 1.0
+    for i in range(1, len(x)):
+        cur = float(x[i])
+        if w == w:
+            old_wt *= 1.0 - alpha
+            if cur == cur:
+                if w != cur:
+                    w = (old_wt * w + alpha * cur) / (old_wt + alpha)
+                old_wt = 1.0
+        elif cur == cur:
+            w = cur
+        out[i] = w
+    return out
+
+@njit(cache=True)
+def _rolling_back_extreme(arr, w, is_max):
+    # monotonic deque of indices in dq[head:tail]; the head is the first extreme of
+    # arr[i-w:i+1] (strict pops keep the earliest index on ties, like idxmax/idxmin)
+    n = len(arr)
+    val = np.empty(n, arr.dtype)
+    pos = np.empty(n, np.int64)
+    dq = np.empty(n, np.int64)
+    head = 0
+    tail = 0
+    for i in range(n):
+        while tail > head and ((is_max and arr[dq[tail-1]] < arr[i]) or
+                               (not is_max and arr[dq[tail-1]] > arr[i])):
+            tail -= 1
+        dq[tail] = i
+        tail += 1
+        while dq[head] < i - w:
+            head += 1
+        val[i] = arr[dq[head]]
+        pos[i] = dq[head]
+    return val, pos
+
+@njit(cache=True)
+def rolling_argmax_min(high, low, lookback=SWING_LOOKBACK):
+    """(max, argmax) of high and (min, argmin) of low over [i-lookback, i], O(n) overall."""
+    swing_high, shi = _rolling_back_extreme(high, lookback, True)
+    swing_low, sli = _rolling_back_extreme(low, lookback, False)
+    return swing_high, shi, swing_low, sli
+
 def find_recent_swings(df, idx, lookback=SWING_LOOKBACK):
+    # single-bar lookup; the backtest reads the precomputed swing_high/low columns instead
     start = max(0, idx - lookback)
-    sub = df.iloc[start: idx+1]
-    if sub.empty:
+    h_slice = df["high"].to_numpy()[start: idx+1]
+    l_slice = df["low"].to_numpy()[start: idx+1]
+    if len(h_slice) == 0:
         return None, None, None, None
-    hi_idx = sub["high"].idxmax()
-    lo_idx = sub["low"].idxmin()
-    swing_high = float(df.at[hi_idx, "high"])
-    swing_low = float(df.at[lo_idx, "low"])
-    return swing_high, int(hi_idx), swing_low, int(lo_idx)
+    hi_off = int(np.argmax(h_slice))
+    lo_off = int(np.argmin(l_slice))
+    return float(h_slice[hi_off]), start + hi_off, float(l_slice[lo_off]), start + lo_off
 
 def compute_fib_levels(swing_high, swing_low):
+    # works on scalars or on the whole swing_high/low columns at once
     diff = swing_high - swing_low
     return {lvl: swing_high - diff * lvl for lvl in FIB_LEVELS}
 
 def touched_level(price, level_val):
     tol = level_val * FIB_TOL_PCT
-    return abs(price - level_val) <= tol
+    return np.abs(price - level_val) <= tol
 
-def calc_lots_from_risk(equity, entry, sl):
-    risk_amount = equity * RISK_PER_TRADE
+@njit(cache=True)
+def calc_lots_from_risk(equity, entry, sl, risk_per_trade=RISK_PER_TRADE, lot_step=LOT_STEP):
     price_diff = abs(entry - sl)
     if price_diff <= 0:
         return 0.001
-    # assume 1 contract per lot (crypto)
-    lots = risk_amount / price_diff
-    # round to LOT_STEP
-    steps = math.floor(lots / LOT_STEP)
-    lots_adj = max(LOT_STEP, steps * LOT_STEP)
-    return round(lots_adj, 6)
+    # assume 1 contract per lot (crypto); round down to LOT_STEP (floor in float: an int
+    # cast would overflow int64 in the JIT once equity compounds far enough)
+    return max(lot_step, np.floor(equity * risk_per_trade / price_diff / lot_step) * lot_step)
 
 # ---- Backtest engine ----
-def run_backtest(df, initial_equity=10000):
+BUY, SELL = 0, 1
+TP, SL, NO_HIT = 0, 1, 2
+SIDE_NAMES = np.array(["BUY", "SELL"])
+REASON_NAMES = np.array(["TP", "SL", "NO_HIT"])
+
+@njit(cache=True)
+def _bar_exit(h, l, side, entry, target_sl, target_tp):
+    # exit checks for one bar, in the engine's order (TP before SL); -1 when still open
+    if side == BUY:
+        if l <= target_tp:
+            return TP
+        if h >= target_sl and target_sl > entry:
+            return SL
+        if l <= target_sl:
+            return SL
+    else:
+        if h >= target_tp:
+            return TP
+        if l <= target_sl:
+            return SL
+    return -1
+
+@njit(cache=True)
+def _scan_exit(high, low, close, start, end, side, entry, target_sl, target_tp, lots):
+    """
+    First bar in [start, end) that hits TP or SL. Once the open profit reaches the initial
+    risk the stop moves to breakeven for the following bars. Returns
+    (exit bar, exit price, reason, final stop); exit bar is -1 when nothing is hit.
+    """
+    initial_risk = abs(entry - target_sl) * lots
+    j = start
+    # phase 1: initial stop, watching for the breakeven trigger
+    while j < end:
+        reason = _bar_exit(high[j], low[j], side, entry, target_sl, target_tp)
+        if reason >= 0:
+            return j, (target_tp if reason == TP else target_sl), reason, target_sl
+        unreal = (close[j] - entry) * lots if side == BUY else (entry - close[j]) * lots
+        j += 1
+        if unreal >= initial_risk:
+            target_sl = entry
+            break
+    # phase 2: stop at breakeven, nothing left to track but the exits
+    while j < end:
+        reason = _bar_exit(high[j], low[j], side, entry, target_sl, target_tp)
+        if reason >= 0:
+            return j, (target_tp if reason == TP else target_sl), reason, target_sl
+        j += 1
+    return -1, 0.0, NO_HIT, target_sl
+
+@njit(cache=True)
+def _run_backtest_nb(high, low, close, atr, swing_highs, swing_lows, candidate_idx, signal,
+                     hour, day_id, allowed_hour_mask, use_hours, initial_equity, rr,
+                     risk_per_trade, lot_step, daily_max_trades, daily_max_loss_pct, max_hold):
+    """
+    Trade engine on raw arrays, visiting only the signal bars in candidate_idx. Returns the
+    per-bar equity curve and the trades as column arrays; side/reason are BUY/SELL and
+    TP/SL/NO_HIT codes.
+    """
+    n = len(close)
     equity = initial_equity
-    equity_curve = []
-    trades = []
-    daily_trades = {}
-    daily_loss_stop = {}
-    last_trade_day = None
-
-    for idx in range(len(df)):
-        row = df.iloc[idx]
-        dtstamp = row["datetime"]
-        price = float(row["close"])
-        if idx < ATR_PERIOD or idx < EMA_SLOW:
-            equity_curve.append((dtstamp, equity))
-            continue
+    eq_val = np.empty(n)
+    filled = 0
+
+    # trade columns (struct of arrays); a candidate bar opens at most one trade
+    cap = len(candidate_idx)
+    entry_idx = np.empty(cap, np.int64)
+    exit_idx = np.empty(cap, np.int64)
+    side_code = np.empty(cap, np.int8)
+    entry_px = np.empty(cap)
+    sl_px = np.empty(cap)
+    tp_px = np.empty(cap)
+    lots_out = np.empty(cap)
+    pnl_out = np.empty(cap)
+    reason_code = np.empty(cap, np.int8)
+    ntr = 0
+
+    have_day = False
+    last_day = 0
+    trades_today = 0
+    day_pnl = 0.0
+    loss_stop = False
+
+    for idx in candidate_idx:
+        # equity is flat on the bars without a signal
+        eq_val[filled:idx + 1] = equity
+        filled = idx + 1
 
         # time filter
-        if ALLOWED_HOURS:
-            if dtstamp.hour not in ALLOWED_HOURS:
-                equity_curve.append((dtstamp, equity))
-                continue
-
-        # daily reset
-        day = dtstamp.date()
-        if day != last_trade_day:
-            daily_trades[day] = 0
-            daily_loss_stop[day] = False
-            last_trade_day = day
-
-        if daily_loss_stop.get(day, False):
-            equity_curve.append((dtstamp, equity))
+        if use_hours and not allowed_hour_mask[hour[idx]]:
             continue
 
-        # skip if daily max trades reached
-        if daily_trades.get(day, 0) >= DAILY_MAX_TRADES:
-            equity_curve.append((dtstamp, equity))
+        # daily reset
+        day = day_id[idx]
+        if not have_day or day != last_day:
+            trades_today = 0
+            day_pnl = 0.0
+            loss_stop = False
+            last_day = day
+            have_day = True
+
+        if loss_stop or trades_today >= daily_max_trades:
             continue
 
-        # indicators at this bar
-        rsi = row["rsi"]
-        ema50 = row["ema50"]
-        ema200 = row["ema200"]
-        atr = row["atr"]
-
-        # find swings and fibs
-        swing_high, shi, swing_low, sli = find_recent_swings(df, idx)
-        if swing_high is None:
-            equity_curve.append((dtstamp, equity))
-            continue
-        fibs = compute_fib_levels(swing_high, swing_low)
-
-        # check fib touches
-        signal = None
-        for lvl, lvl_val in fibs.items():
-            if touched_level(price, lvl_val):
-                # BUY condition
-                if rsi is not None and rsi <= RSI_OVERSOLD and ema50 > ema200:
-                    side = "BUY"
-                    entry = price
-                    sl = swing_low - (0.5 * atr)   # buffer 0.5 ATR
-                    tp = entry + (entry - sl) * RR
-                    signal = dict(side=side, entry=entry, sl=sl, tp=tp, level=lvl)
-                    break
-                # SELL condition
-                if rsi is not None and rsi >= RSI_OVERBOUGHT and ema50 < ema200:
-                    side = "SELL"
-                    entry = price
-                    sl = swing_high + (0.5 * atr)
-                    tp = entry - (sl - entry) * RR
-                    signal = dict(side=side, entry=entry, sl=sl, tp=tp, level=lvl)
-                    break
-
-        if not signal:
-            equity_curve.append((dtstamp, equity))
-            continue
+        side = signal[idx]
+        entry = close[idx]
+        if side == BUY:
+            target_sl = swing_lows[idx] - (0.5 * atr[idx])   # buffer 0.5 ATR
+            target_tp = entry + (entry - target_sl) * rr
+        else:
+            target_sl = swing_highs[idx] + (0.5 * atr[idx])
+            target_tp = entry - (target_sl - entry) * rr
 
-        # position sizing
-        lots = calc_lots_from_risk(equity, signal["entry"], signal["sl"])
+        lots = calc_lots_from_risk(equity, entry, target_sl, risk_per_trade, lot_step)
         if lots <= 0:
-            equity_curve.append((dtstamp, equity))
             continue
 
-        # Now simulate trade result: find next bars where SL or TP hit
-        entry_price = signal["entry"]
-        target_sl = signal["sl"]
-        target_tp = signal["tp"]
-        side = signal["side"]
-
-        # simulate forward until hit sl or tp or horizon (max 1000 bars)
-        exit_price = None
-        exit_time = None
-        exit_reason = None
-        pnl = 0.0
-        trailing_active = False
-        trailing_sl = target_sl
-
-        for j in range(idx+1, min(len(df), idx + 1000)):
-            r = df.iloc[j]
-            h = float(r["high"])
-            l = float(r["low"])
-            ttime = r["datetime"]
-
-            # SELL: tp < entry, sl > entry
-            if side == "BUY":
-                # TP hit?
-                if l <= target_tp:
-                    exit_price = target_tp
-                    exit_time = ttime
-                    exit_reason = "TP"
-                    pnl = (exit_price - entry_price) * lots
-                    break
-                # SL hit?
-                if h >= target_sl and target_sl > entry_price:
-                    # unusual but check
-                    exit_price = target_sl
-                    exit_time = ttime
-                    exit_reason = "SL"
-                    pnl = (exit_price - entry_price) * lots
-                    break
-                if l <= target_sl:
-                    exit_price = target_sl
-                    exit_time = ttime
-                    exit_reason = "SL"
-                    pnl = (exit_price - entry_price) * lots
-                    break
-            else:  # SELL
-                if h >= target_tp:
-                    exit_price = target_tp
-                    exit_time = ttime
-                    exit_reason = "TP"
-                    pnl = (entry_price - exit_price) * lots
-                    break
-                if l <= target_sl:
-                    exit_price = target_sl
-                    exit_time = ttime
-                    exit_reason = "SL"
-                    pnl = (entry_price - exit_price) * lots
-                    break
-
-            # trailing stop simple: if unrealized profit > 1x initial risk, move SL to breakeven
-            unreal = ( (r["close"] - entry_price) * lots ) if side == "BUY" else ((entry_price - r["close"]) * lots)
-            initial_risk = abs(entry_price - target_sl) * lots
-            if not trailing_active and unreal >= initial_risk:
-                trailing_active = True
-                # move SL to breakeven (entry)
-                if side == "BUY":
-                    target_sl = entry_price
-                else:
-                    target_sl = entry_price
-
-        # if no exit found within horizon, close at last close
-        if exit_price is None:
-            last = df.iloc[min(len(df)-1, idx+999)]
-            exit_price = float(last["close"])
-            exit_time = last["datetime"]
-            exit_reason = "NO_HIT"
-            pnl = (exit_price - entry_price) * lots if side=="BUY" else (entry_price - exit_price) * lots
-
-        # update equity
+        # simulate forward until SL/TP or the horizon
+        exit_j, exit_price, reason, target_sl = _scan_exit(
+            high, low, close, idx + 1, min(n, idx + max_hold), side, entry, target_sl, target_tp, lots)
+
+        # no exit within horizon: close at the last bar's close
+        if exit_j < 0:
+            exit_j = min(n - 1, idx + max_hold - 1)
+            exit_price = close[exit_j]
+        if side == BUY:
+            pnl = (exit_price - entry) * lots
+        else:
+            pnl = (entry - exit_price) * lots
+
         equity += pnl
-        equity_curve.append((exit_time, equity))
-
-        # log trade
-        trades.append({
-            "entry_time": row["datetime"],
-            "exit_time": exit_time,
-            "side": side,
-            "entry": entry_price,
-            "sl": target_sl,
-            "tp": target_tp,
+        eq_val[idx] = equity
+
+        entry_idx[ntr] = idx
+        exit_idx[ntr] = exit_j
+        side_code[ntr] = side
+        entry_px[ntr] = entry
+        sl_px[ntr] = target_sl
+        tp_px[ntr] = target_tp
+        lots_out[ntr] = lots
+        pnl_out[ntr] = pnl
+        reason_code[ntr] = reason
+        ntr += 1
+
+        # daily bookkeeping: stop the day once its trades lose DAILY_MAX_LOSS_PCT
+        trades_today += 1
+        day_pnl += pnl
+        if day_pnl <= -initial_equity * daily_max_loss_pct:
+            loss_stop = True
+
+    eq_val[filled:] = equity
+    return (eq_val, entry_idx[:ntr], exit_idx[:ntr], side_code[:ntr], entry_px[:ntr],
+            sl_px[:ntr], tp_px[:ntr], lots_out[:ntr], pnl_out[:ntr], reason_code[:ntr])
+
+def signal_mask(close, rsi, ema50, ema200, swing_high, swing_low):
+    """BUY/SELL masks: close within FIB_TOL_PCT of a fib retracement, with RSI and EMA trend agreeing."""
+    touched = np.zeros(len(close), dtype=np.bool_)
+    for lvl_val in compute_fib_levels(swing_high, swing_low).values():
+        touched |= touched_level(close, lvl_val)
+    buy_mask = touched & (rsi <= RSI_OVERSOLD) & (ema50 > ema200)
+    sell_mask = touched & (rsi >= RSI_OVERBOUGHT) & (ema50 < ema200)
+    return buy_mask, sell_mask
+
+def run_backtest(df, initial_equity=10000):
+    dt = df["datetime"].to_numpy()
+    high, low, close, atr, swing_high, swing_low = (
+        df[c].to_numpy() for c in ("high", "low", "close", "atr", "swing_high", "swing_low"))
+    buy_mask, sell_mask = signal_mask(close, df["rsi"].to_numpy(), df["ema50"].to_numpy(),
+                                      df["ema200"].to_numpy(), swing_high, swing_low)
+    # no trading until the slow EMA/ATR have warmed up; the kernel never sees those bars
+    warmup = max(ATR_PERIOD, EMA_SLOW)
+    candidate_idx = np.flatnonzero(buy_mask[warmup:] | sell_mask[warmup:]) + warmup
+    signal = np.where(buy_mask, BUY, SELL).astype(np.int8)
+    day_id = df["day_id"].to_numpy()
+    hour = dt.astype("datetime64[h]").view("i8") % 24
+    allowed_hour_mask = np.zeros(24, dtype=np.bool_)
+    allowed_hour_mask[list(ALLOWED_HOURS)] = True
+    # the kernel gets float64 copies: float32 scalars would keep the plain-Python fallback's
+    # trade math (and so P&L/equity) in float32, while numba promotes it to float64
+    prices = [a.astype(np.float64) for a in (high, low, close, atr, swing_high, swing_low)]
+
+    (eq_val, entry_idx, exit_idx, side_code, entry, sl, tp, lots, pnl,
+     reason_code) = _run_backtest_nb(
+        *prices, candidate_idx, signal,
+        hour, day_id, allowed_hour_mask, bool(ALLOWED_HOURS), float(initial_equity), RR,
+        RISK_PER_TRADE, LOT_STEP, DAILY_MAX_TRADES, DAILY_MAX_LOSS_PCT, MAX_HOLD_BARS)
+
+    if len(pnl):
+        trades_df = pd.DataFrame({
+            "entry_time": dt[entry_idx],
+            "exit_time": dt[exit_idx],
+            "side": np.take(SIDE_NAMES, side_code),
+            "entry": entry,
+            "sl": sl,
+            "tp": tp,
             "lots": lots,
             "pnl": pnl,
-            "reason": exit_reason
+            "reason": np.take(REASON_NAMES, reason_code),
         })
-
-        # daily bookkeeping
-        daily_trades[day] = daily_trades.get(day, 0) + 1
-        # if daily loss exceeded, mark stop
-        day_pnl = sum([t["pnl"] for t in trades if pd.to_datetime(t["entry_time"]).date() == day])
-        if day_pnl <= -initial_equity * DAILY_MAX_LOSS_PCT:
-            daily_loss_stop[day] = True
-
-    trades_df = pd.DataFrame(trades)
-    equity_df = pd.DataFrame(equity_curve, columns=["datetime","equity"]).dropna().reset_index(drop=True)
+    else:
+        trades_df = pd.DataFrame()
+    equity_df = pd.DataFrame({"datetime": dt, "equity": eq_val}).dropna().reset_index(drop=True)
     return trades_df, equity_df
 
 # ---- Metrics and monthly report ----
 def compute_metrics(trades_df, equity_df, initial_equity):
     total_trades = len(trades_df)
-    wins = trades_df[trades_df["pnl"] > 0]
-    losses = trades_df[trades_df["pnl"] <= 0]
+    # run_backtest returns a column-less frame when nothing traded
+    pnl = trades_df["pnl"] if total_trades>0 else pd.Series(dtype=np.float64)
+    wins = pnl[pnl > 0]
+    losses = pnl[pnl <= 0]
     winrate = len(wins) / total_trades * 100 if total_trades>0 else 0
-    gross_win = wins["pnl"].sum()
-    gross_loss = -losses["pnl"].sum()
-    profit_factor = gross_win / gross_loss if gross_loss>0 else np.inf
-    net_profit = trades_df["pnl"].sum()
+    gross_win = wins.sum()
+    gross_loss = -losses.sum()
+    profit_factor = gross_win / gross_loss if gross_loss>0 else (np.inf if total_trades>0 else 0.0)
+    net_profit = pnl.sum()
     # max drawdown from equity series
     eq = equity_df["equity"].values if not equity_df.empty else np.array([initial_equity])
     peak = np.maximum.accumulate(eq)
@@ -360,38 +514,90 @@ def compute_metrics(trades_df, equity_df, initial_equity):
 def monthly_report(trades_df):
     if trades_df.empty:
         return pd.DataFrame()
-    tr = trades_df.copy()
-    tr["entry_time"] = pd.to_datetime(tr["entry_time"])
-    tr["month"] = tr["entry_time"].dt.to_period("M").astype(str)
+    pnl = trades_df["pnl"]
+    tr = pd.DataFrame({
+        "month": pd.to_datetime(trades_df["entry_time"]).dt.to_period("M").astype(str),
+        "pnl": pnl,
+        "win": (pnl > 0).astype(np.int64),
+        "loss": (pnl <= 0).astype(np.int64),
+    })
+    # plain column sums stay on the cython groupby path (no per-group python lambdas)
     grouped = tr.groupby("month").agg(
         trades = ("pnl","count"),
         net_pnl = ("pnl","sum"),
-        wins = ("pnl", lambda x: (x>0).sum()),
-        losses = ("pnl", lambda x: (x<=0).sum()),
+        wins = ("win","sum"),
+        losses = ("loss","sum"),
     ).reset_index()
     grouped["winrate"] = grouped["wins"] / grouped["trades"] * 100
     return grouped
 
+# ---- Output ----
+def save_table(df, path, fmt="csv"):
+    """Writes df as csv, or as parquet (same name, .parquet) which is far cheaper to write and reload."""
+    if fmt == "parquet":
+        path = os.path.splitext(path)[0] + ".parquet"
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+# ---- Batch runs ----
+def _run_one(path, initial_equity):
+    # top-level so ProcessPoolExecutor can pickle it
+    df = load_with_indicators(path)
+    trades_df, equity_df = run_backtest(df, initial_equity=initial_equity)
+    return path, compute_metrics(trades_df, equity_df, initial_equity), trades_df, equity_df
+
+def run_batch(csv_paths, initial_equity=10000, workers=None):
+    """Backtests independent CSVs (symbols, walk-forward slices) in parallel processes."""
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as ex:
+        futures = {ex.submit(_run_one, path, initial_equity): path for path in csv_paths}
+        for done, fut in enumerate(as_completed(futures), 1):
+            try:
+                path, metrics, trades_df, equity_df = fut.result()
+            except Exception as e:
+                # one bad input shouldn't throw away the other runs
+                print(f"[{done}/{len(csv_paths)}] {futures[fut]}: failed ({e!r})")
+                continue
+            print(f"[{done}/{len(csv_paths)}] {path}: {metrics}")
+            results[path] = (metrics, trades_df, equity_df)
+    return results
+
 # ---- Main CLI ----
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("csv", help="Path to historical csv (merged 5y BTC candles)")
+    parser.add_argument("csv", nargs="+", help="Path(s) or glob(s) of historical csv (merged 5y BTC candles)")
     parser.add_argument("--initial", type=float, default=10000, help="Initial equity")
+    parser.add_argument("--workers", type=int, default=None, help="Processes for multi-csv runs (default: all cores)")
+    parser.add_argument("--no-plot", action="store_true", help="Skip the equity curve PNG")
+    parser.add_argument("--out-format", choices=("csv", "parquet"), default="csv", help="Format of the trades/monthly outputs")
     args = parser.parse_args()
 
-    df = load_csv(args.csv)
+    paths = [p for pat in args.csv for p in (sorted(glob.glob(pat)) or [pat])]
+    if len(paths) > 1:
+        # one trades log per input, summary metrics printed as each run finishes
+        for path, (metrics, trades_df, equity_df) in run_batch(paths, args.initial, args.workers).items():
+            stem = os.path.splitext(os.path.basename(path))[0]
+            out = save_table(trades_df, f"{stem}_{_path_key(path)}_{TRADES_CSV}", args.out_format)
+            print(f"Trades saved to {out} ({len(trades_df)} trades)")
+        return
+
+    df = load_with_indicators(paths[0])
     print("Loaded", len(df), "rows, head:")
     print(df.head())
 
-    df = add_indicators(df)
     trades_df, equity_df = run_backtest(df, initial_equity=args.initial)
 
     # save trades
-    trades_df.to_csv(TRADES_CSV, index=False)
-    print(f"Trades saved to {TRADES_CSV} ({len(trades_df)} trades)")
-
-    # equity plot
-    if not equity_df.empty:
+    out = save_table(trades_df, TRADES_CSV, args.out_format)
+    print(f"Trades saved to {out} ({len(trades_df)} trades)")
+
+    # equity plot (matplotlib only loaded here, headless backend)
+    if not args.no_plot and not equity_df.empty:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
         plt.figure(figsize=(12,6))
         plt.plot(equity_df["datetime"], equity_df["equity"], label="Equity")
         plt.xlabel("Time"); plt.ylabel("Equity")
@@ -403,8 +609,8 @@ def main():
 
     # monthly
     monthly = monthly_report(trades_df)
-    monthly.to_csv(MONTHLY_CSV, index=False)
-    print(f"Monthly report saved to {MONTHLY_CSV}")
+    out = save_table(monthly, MONTHLY_CSV, args.out_format)
+    print(f"Monthly report saved to {out}")
 
     # summary metrics
     metrics = compute_metrics(trades_df, equity_df, args.initial)